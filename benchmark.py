@@ -0,0 +1,522 @@
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def report(name, samples):
+    """Print mean and percentile latencies for a list of seconds."""
+    ms = np.asarray(samples) * 1000.0
+    print(f"{name}: mean {ms.mean():.3f} ms, p50 {np.percentile(ms, 50):.3f} ms, "
+          f"p99 {np.percentile(ms, 99):.3f} ms ({len(ms)} runs)")
+
+
+def bench_identify(args):
+    """Time 1:N face identification against a synthetic population."""
+    from face_index import FaceIndex
+
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = FaceIndex(index_dir, initial_capacity=args.users * args.encodings_per_user)
+
+        start = time.perf_counter()
+        batch_users = 1000
+        for first in range(0, args.users, batch_users):
+            index.add_many([(f"user{user}", rng.normal(0, 0.1, (args.encodings_per_user, 128)))
+                            for user in range(first, min(first + batch_users, args.users))])
+        print(f"Indexed {args.users} users ({len(index)} rows) in {time.perf_counter() - start:.2f} s")
+
+        queries = rng.normal(0, 0.1, (args.runs, 128)).astype(np.float32)
+        index.identify(queries[0])
+
+        samples = []
+        for query in queries:
+            start = time.perf_counter()
+            index.identify(query)
+            samples.append(time.perf_counter() - start)
+        report(f"identify @ {args.users} users", samples)
+
+
+def bench_voice_index(args):
+    """1:N speaker search and cohort scoring against synthetic populations of each size."""
+    from voice_index import VoiceIndex
+
+    rng = np.random.default_rng(0)
+
+    for users in args.users:
+        signatures = rng.normal(0, 10, (users, 13)).astype(np.float32)
+        usernames = [f"user{user}" for user in range(users)]
+
+        start = time.perf_counter()
+        index = VoiceIndex(center=signatures.mean(axis=0), initial_capacity=users)
+        index.add_many(list(zip(usernames, signatures)))
+        print(f"Indexed {users} voices in {time.perf_counter() - start:.2f} s "
+              f"({index.matrix.nbytes / 1e6:.1f} MB)")
+
+        claimed = rng.integers(0, users, args.runs)
+        queries = signatures[claimed] + rng.normal(0, 1, (args.runs, 13)).astype(np.float32)
+        index.nearest(queries[0])
+
+        for name, search in (("nearest", lambda i: index.nearest(queries[i], args.k)),
+                             ("cohort score", lambda i: index.cohort_score(queries[i], usernames[claimed[i]],
+                                                                           args.cohort_size))):
+            samples = []
+            for i in range(args.runs):
+                start = time.perf_counter()
+                search(i)
+                samples.append(time.perf_counter() - start)
+            report(f"{name} @ {users} voices", samples)
+
+        start = time.perf_counter()
+        index.nearest_batch(queries, args.k)
+        elapsed = time.perf_counter() - start
+        print(f"nearest_batch @ {users} voices: {elapsed / args.runs * 1000:.3f} ms per query "
+              f"({args.runs} queries in one call)")
+
+        samples = []
+        for i in range(args.runs):
+            username = usernames[claimed[i]]
+            start = time.perf_counter()
+            index.remove(username)
+            index.add(username, signatures[claimed[i]])
+            samples.append(time.perf_counter() - start)
+        report(f"remove + add @ {users} voices", samples)
+
+        if users <= args.baseline_max:
+            # One np.linalg.norm per enrolled user, as 1:1 verification does it
+            samples = []
+            for query in queries[:10]:
+                start = time.perf_counter()
+                min(range(users), key=lambda user: np.linalg.norm(signatures[user] - query))
+                samples.append(time.perf_counter() - start)
+            report(f"per-user loop @ {users} voices", samples)
+
+
+def _disk_usage(root):
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(root) for name in names)
+
+
+def bench_file_store(args):
+    """Upload time and disk use when every user uploads the same file, plain copies vs chunks."""
+    from file_store import ChunkedFileStore, DirectoryFileStore
+
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        original = os.path.join(work_dir, "original.bin")
+        edited = os.path.join(work_dir, "edited.bin")
+        data = rng.integers(0, 256, args.size_mb * 1024 * 1024, dtype=np.uint8).tobytes()
+        with open(original, "wb") as f:
+            f.write(data)
+        # The same file with a few bytes inserted in the middle
+        with open(edited, "wb") as f:
+            f.write(data[:len(data) // 2] + b"edited" + data[len(data) // 2:])
+
+        for name, store in (("directory", DirectoryFileStore(os.path.join(work_dir, "files"))),
+                            ("chunked", ChunkedFileStore(os.path.join(work_dir, "chunks")))):
+            samples = []
+            for user in range(args.users):
+                start = time.perf_counter()
+                store.upload(f"user{user}", original if user % 2 == 0 else edited)
+                samples.append(time.perf_counter() - start)
+            report(f"{name} upload of {args.size_mb} MB", samples)
+            print(f"{name}: {args.users} uploads use {_disk_usage(store.root) / (1024 * 1024):.1f} MB on disk")
+
+            start = time.perf_counter()
+            store.download("user1", "edited.bin", os.path.join(work_dir, "downloaded.bin"))
+            print(f"{name} download: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def load_images(image_dir):
+    """Load every .jpg/.jpeg/.png under a directory as an RGB array."""
+    import face_recognition
+
+    paths = sorted(path for pattern in ("*.jpg", "*.jpeg", "*.png")
+                   for path in glob.glob(os.path.join(image_dir, "**", pattern), recursive=True))
+    return [face_recognition.load_image_file(path) for path in paths]
+
+
+def bench_detect_scale(args):
+    """Latency and recall of HOG detection at each detection scale.
+
+    Recall is measured against the faces found at full resolution.
+    """
+    from face_detection import HogFaceDetector, box_iou
+
+    frames = load_images(args.images)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+
+    reference = [HogFaceDetector(1.0, args.upsample).detect(frame) for frame in frames]
+    total_faces = sum(len(boxes) for boxes in reference)
+    print(f"{len(frames)} images, {total_faces} faces at full resolution")
+
+    for scale in args.scales:
+        detector = HogFaceDetector(scale, args.upsample)
+        samples = []
+        found = 0
+        for frame, expected in zip(frames, reference):
+            start = time.perf_counter()
+            boxes = detector.detect(frame)
+            samples.append(time.perf_counter() - start)
+            found += sum(1 for box in expected if any(box_iou(box, other) >= 0.5 for other in boxes))
+
+        recall = found / total_faces if total_faces else float('nan')
+        report(f"scale {scale:g} (recall {recall:.3f})", samples)
+
+
+def bench_cascade(args):
+    """Per-stage rejection counts and latency of the staged detector vs plain HOG."""
+    from face_detection import CascadeFaceDetector, HogFaceDetector, load_haar_cascade
+
+    frames = load_images(args.images)
+    if not frames:
+        print(f"No images found in {args.images}")
+        return
+
+    cascade = CascadeFaceDetector(load_haar_cascade(), use_cnn=args.cnn, motion_threshold=args.motion_threshold)
+    hog = HogFaceDetector()
+
+    for name, detector in (("hog", hog), ("cascade", cascade)):
+        samples = []
+        for frame in frames:
+            start = time.perf_counter()
+            detector.detect(frame)
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+    for stage, count in cascade.stats().items():
+        print(f"  {stage}: {count}")
+
+
+def load_video(path, limit=None):
+    """Read a video file into a list of RGB frames."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames
+
+
+def bench_tracking(args):
+    """Per-frame detection cost with and without the template-matching tracker."""
+    from face_detection import HogFaceDetector
+    from face_tracking import TrackingFaceDetector
+
+    frames = load_video(args.video, args.frames)
+    if not frames:
+        print(f"Could not read frames from {args.video}")
+        return
+
+    tracker = TrackingFaceDetector(HogFaceDetector(), redetect_interval=args.redetect_interval)
+    for name, detector in (("detect every frame", HogFaceDetector()), ("tracking", tracker)):
+        samples = []
+        for frame in frames:
+            start = time.perf_counter()
+            detector.detect(frame)
+            samples.append(time.perf_counter() - start)
+        report(name, samples)
+
+    for counter, count in tracker.stats().items():
+        print(f"  {counter}: {count}")
+
+
+def bench_mfcc(args):
+    """Built-in MFCC extractor vs librosa: import time, per-clip latency and agreement."""
+    import importlib
+
+    start = time.perf_counter()
+    voice_features = importlib.import_module("voice_features")
+    print(f"import voice_features: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    samples = int(args.sample_rate * args.duration)
+    # Noise under a slow envelope, so the clips have loud and quiet frames
+    envelope = np.abs(np.sin(np.linspace(0, 3 * np.pi, samples)))
+    clips = (rng.normal(0, 0.1, (args.batch, samples)) * envelope).astype(np.float32)
+
+    start = time.perf_counter()
+    voice_features.mfcc(clips[0], args.sample_rate, args.n_mfcc)
+    print(f"first call: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    samples_ms = []
+    for clip in clips:
+        start = time.perf_counter()
+        voice_features.mfcc(clip, args.sample_rate, args.n_mfcc)
+        samples_ms.append(time.perf_counter() - start)
+    report("voice_features.mfcc per clip", samples_ms)
+
+    start = time.perf_counter()
+    voice_features.mfcc(clips, args.sample_rate, args.n_mfcc)
+    print(f"voice_features.mfcc batch of {args.batch}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    try:
+        start = time.perf_counter()
+        librosa = importlib.import_module("librosa")
+    except ImportError:
+        print("librosa not installed, skipping comparison")
+        return
+    print(f"import librosa: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    librosa.feature.mfcc(y=clips[0], sr=args.sample_rate, n_mfcc=args.n_mfcc)
+    print(f"librosa first call: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    samples_ms = []
+    worst = 0.0
+    for clip in clips:
+        start = time.perf_counter()
+        expected = librosa.feature.mfcc(y=clip, sr=args.sample_rate, n_mfcc=args.n_mfcc)
+        samples_ms.append(time.perf_counter() - start)
+        worst = max(worst, float(np.abs(expected - voice_features.mfcc(clip, args.sample_rate, args.n_mfcc)).max()))
+    report("librosa.feature.mfcc per clip", samples_ms)
+
+    status = "ok" if worst <= args.tolerance else "FAIL"
+    print(f"max abs difference vs librosa: {worst:.2e} (tolerance {args.tolerance:g}) {status}")
+
+
+def _voice_latencies(warm_up, runs, sample_rate=16000):
+    """Voice signature latencies in a fresh process, optionally after warm_up()."""
+    from verification_engine import FaceVoiceVerifier
+
+    verifier = FaceVoiceVerifier(sample_rate=sample_rate)
+    if warm_up:
+        verifier.warm_up(face=False)
+
+    rng = np.random.default_rng(1)
+    samples = []
+    for _ in range(runs):
+        audio = rng.normal(0, 0.1, sample_rate * 5).astype(np.float32)
+        start = time.perf_counter()
+        verifier.voice_signature(audio)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_warm_up(args):
+    """First-call vs steady-state latency of fresh workers, with and without warm-up."""
+    import multiprocessing as mp
+
+    from capture_pipeline import FaceWorkerPool
+
+    frames = load_images(args.images) if args.images else []
+    if not frames:
+        # Without a face the encoder never runs; pass --images for the full path
+        print("No images given, using a synthetic frame (detection only)")
+        frames = [np.random.default_rng(0).integers(0, 256, (480, 640, 3), dtype=np.uint8)]
+
+    for warm_up in (False, True):
+        label = "warmed" if warm_up else "cold"
+        pool = FaceWorkerPool(n_workers=1, warm_up=warm_up)
+        start = time.perf_counter()
+        pool.start()
+        pool.wait_ready()
+        print(f"{label} face worker ready in {time.perf_counter() - start:.2f} s")
+
+        samples = []
+        for run in range(args.runs):
+            start = time.perf_counter()
+            pool.process_batch([frames[run % len(frames)]], "enroll")
+            samples.append(time.perf_counter() - start)
+        pool.stop()
+
+        print(f"{label} face first frame: {samples[0] * 1000:.1f} ms")
+        report(f"{label} face steady state", samples[1:])
+
+    ctx = mp.get_context("spawn")
+    for warm_up in (False, True):
+        label = "warmed" if warm_up else "cold"
+        with ctx.Pool(1) as process:
+            samples = process.apply(_voice_latencies, (warm_up, args.runs))
+        print(f"{label} voice first clip: {samples[0] * 1000:.1f} ms")
+        report(f"{label} voice steady state", samples[1:])
+
+
+def bench_end_to_end(args):
+    """Enrollment and verification on replayed media; needs no camera, microphone or display.
+
+    Without --realtime every frame is processed in order, so runs are
+    deterministic. With it, frames are paced like a camera and go through
+    CapturePipeline, which drops frames while the workers are busy.
+    """
+    import cv2
+
+    from capture_pipeline import CapturePipeline, FaceWorkerPool
+    from media_sources import ImageSequenceSource, VideoFileSource, WavFileSource
+    from score_fusion import FusedVerification, ScoreFusion
+    from verification_engine import create_verifier, select_enrollment_templates
+    from voice_stream import StreamingVoiceVerifier
+
+    def frame_source(loop=False):
+        if args.video:
+            return VideoFileSource(args.video, realtime=args.realtime, loop=loop)
+        return ImageSequenceSource(args.images, realtime=args.realtime, loop=loop)
+
+    def audio_source():
+        return WavFileSource(args.audio, verifier.sample_rate, realtime=args.realtime)
+
+    pool = FaceWorkerPool(args.workers)
+    pool.start()
+    pool.wait_ready()
+    verifier = create_verifier()
+    verifier.warm_up(face=False)
+    voice_stream = StreamingVoiceVerifier(verifier)
+
+    try:
+        # Enrollment: a burst of frames and one recording, as in registration
+        start = time.perf_counter()
+        with frame_source() as source:
+            burst = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in source.frames(args.burst)]
+        encodings = select_enrollment_templates(pool.process_batch(burst, "enroll"))
+        print(f"face enrollment: {len(encodings)} encodings from {len(burst)} frames "
+              f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        if not encodings:
+            print("No face found in the enrollment frames")
+            return
+
+        start = time.perf_counter()
+        with audio_source() as source:
+            voice_signature = verifier.enroll_voice(source.record(5)).template
+        print(f"voice enrollment: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        face_samples, voice_samples, fused_samples = [], [], []
+        accepted = {"face": 0, "voice": 0, "fused": 0}
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            with frame_source() as source:
+                if args.realtime:
+                    pipeline = CapturePipeline(source, pool, "verify", encodings)
+                    pipeline.start()
+                    results = []
+                    while len(results) < args.max_frames and not any(r.result and r.result.accepted
+                                                                      for r in results):
+                        results.extend(pipeline.poll())
+                        time.sleep(0.005)
+                    pipeline.stop()
+                    face_ok = any(r.result and r.result.accepted for r in results)
+                else:
+                    frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in source.frames(args.max_frames)]
+                    results = pool.process_batch(frames, "verify", encodings)
+                    face_ok = any(result is not None and result.accepted for result in results)
+            face_samples.append(time.perf_counter() - start)
+            accepted["face"] += face_ok
+
+            start = time.perf_counter()
+            with audio_source() as source:
+                result = voice_stream.verify(source, voice_signature)
+            voice_samples.append(time.perf_counter() - start)
+            accepted["voice"] += result.accepted
+
+            if args.fused:
+                # Both at once; the replay loops so the face side cannot run out of frames
+                start = time.perf_counter()
+                with frame_source(loop=True) as source:
+                    fusion = ScoreFusion(verifier.face_tolerance, verifier.voice_threshold,
+                                         voice_veto=voice_stream.reject_threshold)
+                    fused = FusedVerification(fusion,
+                                              CapturePipeline(source, pool, "verify", encodings),
+                                              voice_stream, audio_source(), voice_signature,
+                                              max_face_attempts=args.max_frames)
+                    fused.start()
+                    while fused.decision is None:
+                        fused.poll()
+                        time.sleep(0.005)
+                    fused.stop()
+                fused_samples.append(time.perf_counter() - start)
+                accepted["fused"] += fused.decision
+
+        report(f"face verification ({accepted['face']}/{args.runs} accepted)", face_samples)
+        report(f"voice verification ({accepted['voice']}/{args.runs} accepted)", voice_samples)
+        if args.fused:
+            report(f"face and voice at once ({accepted['fused']}/{args.runs} accepted)", fused_samples)
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the face and voice authentication stages")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    identify = subparsers.add_parser("identify", help="1:N face identification latency")
+    identify.add_argument("--users", type=int, default=100000)
+    identify.add_argument("--encodings-per-user", type=int, default=1)
+    identify.add_argument("--runs", type=int, default=200)
+    identify.set_defaults(func=bench_identify)
+
+    voice_index = subparsers.add_parser("voice-index", help="1:N speaker search and cohort scoring")
+    voice_index.add_argument("--users", type=int, nargs="+", default=[10000, 100000, 1000000])
+    voice_index.add_argument("--k", type=int, default=5, help="neighbours returned by nearest()")
+    voice_index.add_argument("--cohort-size", type=int, default=50)
+    voice_index.add_argument("--runs", type=int, default=200)
+    voice_index.add_argument("--baseline-max", type=int, default=100000,
+                             help="largest population to also search with a per-user loop")
+    voice_index.set_defaults(func=bench_voice_index)
+
+    file_store = subparsers.add_parser("file-store", help="duplicate uploads as plain copies vs deduplicated chunks")
+    file_store.add_argument("--users", type=int, default=20)
+    file_store.add_argument("--size-mb", type=int, default=50)
+    file_store.set_defaults(func=bench_file_store)
+
+    detect_scale = subparsers.add_parser("detect-scale", help="face detection latency and recall per scale")
+    detect_scale.add_argument("images", help="directory of face images")
+    detect_scale.add_argument("--scales", type=float, nargs="+", default=[1.0, 0.5, 0.25])
+    detect_scale.add_argument("--upsample", type=int, default=1)
+    detect_scale.set_defaults(func=bench_detect_scale)
+
+    cascade = subparsers.add_parser("cascade", help="staged Haar/HOG/CNN detector vs plain HOG")
+    cascade.add_argument("images", help="directory of frames, with and without faces")
+    cascade.add_argument("--cnn", action="store_true", help="enable the CNN fallback stage")
+    cascade.add_argument("--motion-threshold", type=float, default=None)
+    cascade.set_defaults(func=bench_cascade)
+
+    tracking = subparsers.add_parser("tracking", help="detection cost with frame-to-frame tracking")
+    tracking.add_argument("video", help="video file of a face in front of the camera")
+    tracking.add_argument("--frames", type=int, default=300)
+    tracking.add_argument("--redetect-interval", type=int, default=10)
+    tracking.set_defaults(func=bench_tracking)
+
+    mfcc = subparsers.add_parser("mfcc", help="built-in MFCC extractor vs librosa")
+    mfcc.add_argument("--batch", type=int, default=50)
+    mfcc.add_argument("--duration", type=float, default=5.0)
+    mfcc.add_argument("--sample-rate", type=int, default=16000)
+    mfcc.add_argument("--n-mfcc", type=int, default=13)
+    mfcc.add_argument("--tolerance", type=float, default=1e-3)
+    mfcc.set_defaults(func=bench_mfcc)
+
+    warm_up = subparsers.add_parser("warm-up", help="first-call vs steady-state latency with and without warm-up")
+    warm_up.add_argument("--images", help="directory of face images (default: synthetic frame)")
+    warm_up.add_argument("--runs", type=int, default=20)
+    warm_up.set_defaults(func=bench_warm_up)
+
+    end_to_end = subparsers.add_parser("end-to-end", help="enroll and verify from replayed video/images and WAV")
+    frames = end_to_end.add_mutually_exclusive_group(required=True)
+    frames.add_argument("--video", help="video file of the user's face")
+    frames.add_argument("--images", help="directory of face images, replayed in name order")
+    end_to_end.add_argument("--audio", required=True, help="WAV recording of the user (16 kHz)")
+    end_to_end.add_argument("--realtime", action="store_true", help="pace replay like live devices")
+    end_to_end.add_argument("--burst", type=int, default=15, help="frames used for enrollment")
+    end_to_end.add_argument("--max-frames", type=int, default=60, help="frames per verification attempt")
+    end_to_end.add_argument("--workers", type=int, default=None)
+    end_to_end.add_argument("--runs", type=int, default=5)
+    end_to_end.add_argument("--fused", action="store_true",
+                            help="also verify face and voice concurrently with a fused decision")
+    end_to_end.set_defaults(func=bench_end_to_end)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
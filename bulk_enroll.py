@@ -0,0 +1,207 @@
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from enrollment_store import EnrollmentStore
+from face_index import FaceIndex
+
+DEFAULT_PASSPHRASE = "My voice is my password"
+
+_verifier = None
+
+
+def _init_worker(sample_rate, quality_gate):
+    """Build one verifier per worker process."""
+    global _verifier
+    from face_detection import HogFaceDetector
+    from frame_quality import FrameQualityGate
+    from verification_engine import create_verifier
+
+    # Plain HOG: the tracking detector used for live video would carry
+    # state from one unrelated photo to the next
+    _verifier = create_verifier(detector=HogFaceDetector(), sample_rate=sample_rate,
+                                quality_gate=FrameQualityGate() if quality_gate else None)
+
+
+def load_image(path, max_size=1024):
+    """RGB frame from an image file, downscaled to at most ``max_size`` pixels per side."""
+    import cv2
+
+    frame = cv2.imread(path)
+    if frame is None:
+        raise ValueError(f"cannot read {os.path.basename(path)}")
+    scale = max_size / max(frame.shape[:2])
+    if scale < 1.0:
+        # Camera frames are 640x480; full-size photos only make detection slower
+        frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def load_audio(path, sample_rate=16000):
+    """Mono float32 samples from a WAV file recorded at ``sample_rate``.
+
+    ``path`` may also be a file object, such as a clip received over HTTP.
+    Undecodable files and other sample rates raise ValueError.
+    """
+    import soundfile as sf
+
+    name = os.path.basename(path) if isinstance(path, str) else "clip"
+    try:
+        audio, file_rate = sf.read(path, dtype='float32', always_2d=True)
+    except RuntimeError:
+        raise ValueError(f"cannot decode {name}") from None
+    if file_rate != sample_rate:
+        raise ValueError(f"{name} is {file_rate} Hz, expected {sample_rate} Hz")
+    return audio.mean(axis=1)
+
+
+def enroll_user(user_dir, max_faces=5, min_faces=1, max_size=1024):
+    """Face encodings and voice signature for one ``<root>/<username>`` directory.
+
+    Runs in a worker process. Returns (face_encodings, voice_signature,
+    voiced_signature, image_count); raises ValueError with a short reason when the user cannot
+    be enrolled.
+    """
+    from verification_engine import select_enrollment_templates
+
+    image_paths = sorted(path for pattern in ("*.jpg", "*.jpeg", "*.png")
+                         for path in glob.glob(os.path.join(user_dir, pattern)))
+    audio_paths = sorted(glob.glob(os.path.join(user_dir, "*.wav")))
+    if not image_paths:
+        raise ValueError("no images")
+    if not audio_paths:
+        raise ValueError("no WAV recordings")
+
+    results = []
+    for path in image_paths:
+        results.append(_verifier.enroll_face(load_image(path, max_size)))
+    face_encodings = select_enrollment_templates(results, max_faces)
+    if len(face_encodings) < min_faces:
+        rejected = sorted({result.rejected for result in results if result.rejected})
+        detail = f" (rejected: {', '.join(rejected)})" if rejected else ""
+        raise ValueError(f"{len(face_encodings)} usable faces in {len(image_paths)} images{detail}")
+
+    # Average the signatures when there are several recordings
+    signatures = [_verifier.enroll_voice(load_audio(path, _verifier.sample_rate)).template
+                  for path in audio_paths]
+    voice_signature = np.mean(signatures, axis=0)
+
+    return face_encodings, voice_signature, _verifier.voiced_signatures, len(image_paths)
+
+
+def bulk_enroll(root, store, face_index, files_dir=None, workers=None, passphrase=DEFAULT_PASSPHRASE,
+                sample_rate=16000, max_faces=5, min_faces=1, max_size=1024, quality_gate=True, failure_log=None,
+                progress_every=100):
+    """Enroll every ``<root>/<username>`` directory not yet in the store.
+
+    Users already in the store are skipped, so an interrupted run can simply
+    be started again. Failures are printed and, with ``failure_log``,
+    appended to that file as ``username<TAB>reason``. Returns a dict of
+    counts and throughput.
+    """
+    # Users stored by an interrupted run before their index batch was written
+    face_index.sync(store)
+
+    usernames = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+    pending = [name for name in usernames if name not in store]
+    counts = {"users": len(usernames), "skipped": len(usernames) - len(pending),
+              "enrolled": 0, "failed": 0, "images": 0}
+
+    started = time.perf_counter()
+    index_batch = []
+    failures = open(failure_log, "a") if failure_log else None
+
+    def flush_index():
+        # One fsync per batch instead of per user
+        if index_batch:
+            face_index.add_many(index_batch)
+            index_batch.clear()
+
+    try:
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=(sample_rate, quality_gate)) as executor:
+            futures = {executor.submit(enroll_user, os.path.join(root, username), max_faces, min_faces, max_size):
+                       username for username in pending}
+
+            for done, future in enumerate(as_completed(futures), 1):
+                username = futures[future]
+                try:
+                    face_encodings, voice_signature, voiced_signature, image_count = future.result()
+                    store.add(username, face_encodings, voice_signature, passphrase, voiced_signature)
+                except Exception as e:
+                    counts["failed"] += 1
+                    print(f"Failed to enroll {username}: {e}")
+                    if failures is not None:
+                        failures.write(f"{username}\t{e}\n")
+                        failures.flush()
+                else:
+                    counts["enrolled"] += 1
+                    counts["images"] += image_count
+                    index_batch.append((username, face_encodings))
+                    if files_dir is not None:
+                        os.makedirs(os.path.join(files_dir, username), exist_ok=True)
+
+                if done % progress_every == 0:
+                    flush_index()
+                    elapsed = time.perf_counter() - started
+                    print(f"{done}/{len(pending)} users processed, {done / elapsed:.1f} users/s")
+    finally:
+        flush_index()
+        if failures is not None:
+            failures.close()
+
+    elapsed = time.perf_counter() - started
+    counts["seconds"] = elapsed
+    counts["users_per_second"] = (counts["enrolled"] + counts["failed"]) / elapsed if elapsed else 0.0
+    counts["images_per_second"] = counts["images"] / elapsed if elapsed else 0.0
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Enroll users offline from <root>/<username>/{*.jpg,*.wav} directories")
+    parser.add_argument("root", help="directory with one subdirectory per user")
+    parser.add_argument("--data-dir", default="auth_system_data")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--passphrase", default=DEFAULT_PASSPHRASE)
+    parser.add_argument("--sample-rate", type=int, default=16000, help="WAV files must use this rate")
+    parser.add_argument("--max-faces", type=int, default=5, help="encodings kept per user")
+    parser.add_argument("--min-faces", type=int, default=1, help="fewer usable faces fails the user")
+    parser.add_argument("--max-size", type=int, default=1024, help="downscale larger photos to this many pixels")
+    parser.add_argument("--no-quality-gate", action="store_true", help="encode blurry or badly lit photos too")
+    parser.add_argument("--failure-log", default=None,
+                        help="file to append failed users to (default: <data-dir>/bulk_enroll_failures.log)")
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+
+    store = EnrollmentStore(os.path.join(args.data_dir, "enrollments.fvs"))
+    face_index = FaceIndex(os.path.join(args.data_dir, "face_index"))
+    failure_log = args.failure_log or os.path.join(args.data_dir, "bulk_enroll_failures.log")
+
+    counts = bulk_enroll(args.root, store, face_index,
+                         files_dir=os.path.join(args.data_dir, "user_files"),
+                         workers=args.workers,
+                         passphrase=args.passphrase,
+                         sample_rate=args.sample_rate,
+                         max_faces=args.max_faces,
+                         min_faces=args.min_faces,
+                         max_size=args.max_size,
+                         quality_gate=not args.no_quality_gate,
+                         failure_log=failure_log,
+                         progress_every=args.progress_every)
+
+    print(f"Enrolled {counts['enrolled']} users, {counts['failed']} failed, {counts['skipped']} already enrolled "
+          f"in {counts['seconds']:.1f} s ({counts['users_per_second']:.1f} users/s, "
+          f"{counts['images_per_second']:.1f} images/s); the store now holds {len(store)} users")
+    if counts["failed"]:
+        print(f"Failures were logged to {failure_log}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import threading
+
+
+class CameraManager:
+    """One warm camera session shared by every capture flow.
+
+    acquire() opens the frame source on first use, or reuses the open one,
+    and returns a running FrameGrabber that any number of flows can read
+    from. When the last user calls release() the grabber stops but the
+    device stays open; it is closed after ``idle_timeout`` seconds without
+    a new acquire(), or by close().
+    """
+
+    def __init__(self, source_factory, idle_timeout=60.0, buffer_size=2):
+        self.source_factory = source_factory
+        self.idle_timeout = idle_timeout
+        self.buffer_size = buffer_size
+        self.source = None
+        self.grabber = None
+        self.users = 0
+        self.counters = {"opened": 0, "reused": 0, "idle_closed": 0}
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["open"] = self.source is not None
+        stats["users"] = self.users
+        return stats
+
+    def acquire(self):
+        """Return a running FrameGrabber on the open source; raises if it cannot be opened."""
+        from capture_pipeline import FrameGrabber
+
+        with self._lock:
+            self._cancel_timer()
+            if self.source is None:
+                self.source = self.source_factory().open()
+                self.counters["opened"] += 1
+            else:
+                self.counters["reused"] += 1
+
+            if self.grabber is None:
+                self.grabber = FrameGrabber(self.source, self.buffer_size)
+                self.grabber.start()
+            self.users += 1
+            return self.grabber
+
+    def release(self):
+        with self._lock:
+            self.users = max(0, self.users - 1)
+            if self.users or self.source is None:
+                return
+
+            # Nobody is reading: stop grabbing, but keep the device for the next flow
+            self._stop_grabber()
+            self._timer = threading.Timer(self.idle_timeout, self._close_idle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _close_idle(self):
+        with self._lock:
+            if self.users or self.source is None:
+                return
+            self.counters["idle_closed"] += 1
+            self._close_source()
+
+    def close(self):
+        with self._lock:
+            self._cancel_timer()
+            self.users = 0
+            self._stop_grabber()
+            self._close_source()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _stop_grabber(self):
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.grabber = None
+
+    def _close_source(self):
+        if self.source is not None:
+            self.source.release()
+            self.source = None
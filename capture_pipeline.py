@@ -0,0 +1,380 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from face_index import FaceIndex
+from metrics import metrics
+from verification_engine import create_verifier
+
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+class FrameGrabber:
+    """Thread that keeps reading the camera and holds only the newest frames.
+
+    Frames are flipped for a mirror effect and converted to RGB once, here,
+    and stored in a small ring buffer as (frame_id, captured_at, rgb_frame).
+    Older frames are overwritten rather than queued.
+    """
+
+    def __init__(self, cap, buffer_size=2, mirror=True):
+        self.cap = cap
+        self.mirror = mirror
+        self.frames = deque(maxlen=buffer_size)
+        self.frame_count = 0
+        self.failed_reads = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            with metrics.span("frame_read"):
+                ret, frame = self.cap.read()
+            if not ret:
+                self.failed_reads += 1
+                time.sleep(0.01)
+                continue
+
+            captured_at = time.perf_counter()
+            if self.mirror:
+                frame = cv2.flip(frame, 1)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            with self._cond:
+                self.frame_count += 1
+                self.frames.append((self.frame_count, captured_at, rgb_frame))
+                self._cond.notify_all()
+
+    def latest(self, after_id=0, timeout=None):
+        """Newest frame with an id greater than ``after_id``, or None on timeout."""
+        def ready():
+            return self._stopped or (self.frames and self.frames[-1][0] > after_id)
+
+        with self._cond:
+            self._cond.wait_for(ready, timeout)
+            if self.frames and self.frames[-1][0] > after_id:
+                return self.frames[-1]
+        return None
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _face_worker(worker_id, slot_name, build_verifier, jobs, results, warm_up=True):
+    """Worker process: read frames from a shared-memory slot and detect/encode them.
+
+    Reports readiness as a result with no session once the verifier is
+    built (and warmed up).
+    """
+    slot = shared_memory.SharedMemory(name=slot_name)
+    verifier = build_verifier()
+    timings = verifier.warm_up(voice=False) if warm_up else {}
+    results.put((worker_id, None, None, None, timings, None))
+    mode, payload, face_index = "enroll", None, None
+
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+
+            if job[0] == "configure":
+                _, mode, payload = job
+                face_index = FaceIndex(payload) if mode == "identify" else None
+                if hasattr(verifier.detector, "reset"):
+                    verifier.detector.reset()
+                continue
+
+            _, session, frame_id, captured_at, shape = job
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slot.buf)
+            result, error = None, None
+            try:
+                if mode == "verify":
+                    result = verifier.verify_face(frame, payload)
+                elif mode == "identify":
+                    result = verifier.identify_face(frame, face_index)
+                else:
+                    result = verifier.enroll_face(frame)
+            except Exception as e:
+                error = str(e)
+            del frame
+
+            results.put((worker_id, session, frame_id, captured_at, result, error))
+    finally:
+        slot.close()
+
+
+class FaceWorkerPool:
+    """Long-lived worker processes that run face detection and encoding.
+
+    Each worker owns a shared-memory slot; a frame is copied into the slot
+    of an idle worker and only its shape travels through the job queue.
+    Results land in ``output`` as they complete. With ``warm_up`` each
+    worker runs dummy inference before it accepts its first frame, so the
+    pool can be started early and the first real frame is as fast as any.
+    """
+
+    def __init__(self, n_workers=None, build_verifier=create_verifier, max_frame_bytes=MAX_FRAME_BYTES,
+                 warm_up=True):
+        self.n_workers = n_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.build_verifier = build_verifier
+        self.max_frame_bytes = max_frame_bytes
+        self.warm_up = warm_up
+        self.output = queue.Queue()
+        self.session = 0
+        self.ready = 0
+        self.warm_up_timings = {}
+        self._processes = []
+        self._slots = []
+        self._jobs = []
+        self._idle = set()
+        self._cond = threading.Condition()
+        self._results = None
+        self._collector = None
+
+    def start(self):
+        # Spawn rather than fork: the parent runs Tk and camera threads
+        ctx = mp.get_context("spawn")
+        self._results = ctx.Queue()
+
+        for worker_id in range(self.n_workers):
+            slot = shared_memory.SharedMemory(create=True, size=self.max_frame_bytes)
+            jobs = ctx.Queue()
+            process = ctx.Process(target=_face_worker,
+                                  args=(worker_id, slot.name, self.build_verifier, jobs, self._results,
+                                        self.warm_up),
+                                  daemon=True)
+            process.start()
+            self._slots.append(slot)
+            self._jobs.append(jobs)
+            self._processes.append(process)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            with self._cond:
+                self._idle.add(item[0])
+                if item[1] is None:
+                    # Worker finished starting up; it only becomes idle now
+                    self.ready += 1
+                    self.warm_up_timings[item[0]] = item[4]
+                self._cond.notify_all()
+            if item[1] is not None:
+                self.output.put(item[1:] + (time.perf_counter(),))
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has started (and warmed up); False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.ready >= self.n_workers, timeout)
+
+    def configure(self, mode, payload=None):
+        """Start a new session: "enroll", "verify" (payload: stored encodings)
+        or "identify" (payload: face index directory). Returns the session id.
+        """
+        self.session += 1
+        for jobs in self._jobs:
+            jobs.put(("configure", mode, payload))
+        return self.session
+
+    def acquire(self, timeout=None):
+        """Reserve an idle worker, or return None on timeout."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._idle, timeout):
+                return None
+            return self._idle.pop()
+
+    def release(self, worker_id):
+        with self._cond:
+            self._idle.add(worker_id)
+            self._cond.notify_all()
+
+    def submit(self, worker_id, frame, session, frame_id, captured_at):
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.max_frame_bytes} byte slot")
+        slot = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._slots[worker_id].buf)
+        slot[...] = frame
+        del slot
+        self._jobs[worker_id].put(("frame", session, frame_id, captured_at, frame.shape))
+
+    def process_batch(self, frames, mode="enroll", payload=None):
+        """Run a list of frames through every worker in parallel.
+
+        Unlike CapturePipeline no frame is dropped; results are returned in
+        input order, with None for frames that raised an error.
+        """
+        session = self.configure(mode, payload)
+        results = [None] * len(frames)
+        submitted = 0
+        pending = len(frames)
+
+        while pending:
+            if submitted < len(frames):
+                worker_id = self.acquire(timeout=0.01)
+                if worker_id is not None:
+                    self.submit(worker_id, frames[submitted], session, submitted, time.perf_counter())
+                    submitted += 1
+                    continue
+
+            try:
+                item_session, frame_id, _, result, _, _ = self.output.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if item_session == session:
+                results[frame_id] = result
+                pending -= 1
+                if result is not None:
+                    metrics.observe_timings("face", result.timings)
+
+        return results
+
+    def stop(self):
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        if self._results is not None:
+            self._results.put(None)
+            self._collector.join(timeout=2)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+        self._processes, self._slots, self._jobs = [], [], []
+        self._idle.clear()
+        self.ready = 0
+
+
+class PipelineResult:
+    """Outcome of one processed frame, with its capture-to-result latency."""
+
+    def __init__(self, frame_id, captured_at, completed_at, result, error):
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+        self.completed_at = completed_at
+        self.latency = completed_at - captured_at
+        self.result = result
+        self.error = error
+
+
+class CapturePipeline:
+    """Camera grabber thread -> worker processes -> result queue polled by the UI.
+
+    Whenever a worker is free it receives the newest grabbed frame; frames
+    that arrive while every worker is busy are dropped, never queued.
+    Pass a running ``grabber`` (and no ``cap``) to share one camera session
+    between pipelines; it is then left running on stop().
+    """
+
+    def __init__(self, cap, pool, mode, payload=None, buffer_size=2, grabber=None):
+        self.pool = pool
+        self.mode = mode
+        self.payload = payload
+        self._owns_grabber = grabber is None
+        self.grabber = grabber or FrameGrabber(cap, buffer_size)
+        self.first_frame = 0
+        self.dispatched = 0
+        self.completed = 0
+        self.rejections = {}
+        self.latencies = []
+        self.started_at = None
+        self._running = False
+        self._dispatcher = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.session = self.pool.configure(self.mode, self.payload)
+        self._running = True
+        if self._owns_grabber:
+            self.grabber.start()
+        self.first_frame = self.grabber.frame_count
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def _dispatch(self):
+        last_id = self.first_frame
+        while self._running:
+            worker_id = self.pool.acquire(timeout=0.1)
+            if worker_id is None:
+                continue
+
+            item = self.grabber.latest(last_id, timeout=0.1)
+            if item is None or not self._running:
+                self.pool.release(worker_id)
+                continue
+
+            frame_id, captured_at, frame = item
+            self.pool.submit(worker_id, frame, self.session, frame_id, captured_at)
+            self.dispatched += 1
+            last_id = frame_id
+
+    def latest_frame(self):
+        frames = self.grabber.frames
+        return frames[-1][2] if frames else None
+
+    def poll(self):
+        """Return the results that completed since the last poll."""
+        results = []
+        while True:
+            try:
+                session, frame_id, captured_at, result, error, completed_at = self.pool.output.get_nowait()
+            except queue.Empty:
+                break
+            if session != self.session:
+                continue  # Late result from an earlier session
+
+            item = PipelineResult(frame_id, captured_at, completed_at, result, error)
+            self.completed += 1
+            self.latencies.append(item.latency)
+            metrics.observe("face_pipeline_latency", item.latency)
+            if result is not None:
+                metrics.observe_timings("face", result.timings)
+            if result is not None and result.rejected:
+                self.rejections[result.rejected] = self.rejections.get(result.rejected, 0) + 1
+            results.append(item)
+        return results
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def stats(self):
+        grabbed = self.grabber.frame_count - self.first_frame
+        elapsed = self.elapsed()
+        return {
+            "grabbed": grabbed,
+            "dispatched": self.dispatched,
+            "dropped": grabbed - self.dispatched,
+            "completed": self.completed,
+            "rejected": dict(self.rejections),
+            "mean_latency": float(np.mean(self.latencies)) if self.latencies else None,
+            "results_per_second": self.completed / elapsed if elapsed else 0.0,
+            "elapsed": elapsed,
+        }
+
+    def stop(self):
+        self._running = False
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        if self._owns_grabber:
+            self.grabber.stop()
@@ -0,0 +1,246 @@
+import argparse
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+
+from metrics import metrics
+
+# File layout
+#
+#   header   64 bytes  magic, version, header size, face dim, voice dim
+#   record*            appended one after another, each 4-byte aligned:
+#       16 bytes       magic, record size, name length, passphrase length,
+#                      face count, flags (deleted, voiced-frame voice signature)
+#       name, passphrase (utf-8), zero padding to a 4-byte boundary
+#       float32        face count x face dim face encodings
+#       float32        voice dim voice signature
+#
+# A later record for the same username replaces the earlier one, so adding
+# a user is a single append. A record cut short by a crash fails the size
+# check on open and is dropped.
+
+MAGIC = b"FVAS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH")
+HEADER_SIZE = 64
+RECORD_MAGIC = b"FVRC"
+RECORD = struct.Struct("<4sIHHHH")
+FLAG_DELETED = 1
+# The voice signature averages only voiced frames; records without it
+# (pickle migrations and older enrollments) average every frame
+FLAG_VOICED_SIGNATURE = 2
+
+
+class EnrollmentRecord:
+    """A user's stored templates; the arrays are read-only views of the store.
+
+    ``voiced_signature`` tells whether the voice signature averages only
+    voiced frames; a probe must be averaged the same way to be compared.
+    """
+
+    def __init__(self, username, face_encodings, voice_signature, passphrase, voiced_signature=False):
+        self.username = username
+        self.face_encodings = face_encodings
+        self.voice_signature = voice_signature
+        self.passphrase = passphrase
+        self.voiced_signature = voiced_signature
+
+
+class EnrollmentStore:
+    """Versioned, append-only binary store of face and voice templates."""
+
+    def __init__(self, path, face_dim=128, voice_dim=13):
+        self.path = path
+        self._lock = threading.Lock()
+        self._offsets = {}
+        self._mmap = None
+        self._end = HEADER_SIZE
+
+        if not os.path.exists(path) or os.path.getsize(path) < HEADER_SIZE:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, HEADER_SIZE, face_dim, voice_dim).ljust(HEADER_SIZE, b"\0"))
+                f.flush()
+                os.fsync(f.fileno())
+
+        with open(path, 'rb') as f:
+            magic, version, header_size, self.face_dim, self.voice_dim = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an enrollment store")
+        if version != VERSION or header_size != HEADER_SIZE:
+            raise ValueError(f"Unsupported enrollment store version {version} in {path}")
+
+        self._remap()
+        self._scan(truncate=True)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __contains__(self, username):
+        return username in self._offsets
+
+    def usernames(self):
+        return list(self._offsets)
+
+    def _remap(self):
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _scan(self, truncate=False):
+        size = len(self._mmap)
+        offset = self._end
+
+        while offset + RECORD.size <= size:
+            magic, record_size, name_len, _, _, flags = RECORD.unpack_from(self._mmap, offset)
+            if magic != RECORD_MAGIC or record_size < RECORD.size or offset + record_size > size:
+                break
+
+            username = self._mmap[offset + RECORD.size:offset + RECORD.size + name_len].decode('utf-8')
+            if flags & FLAG_DELETED:
+                self._offsets.pop(username, None)
+            else:
+                self._offsets[username] = offset
+            offset += record_size
+        self._end = offset
+
+        if truncate and offset < size:
+            # Drop a torn trailing record left by an interrupted append
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+            self._remap()
+
+    def refresh(self):
+        """Pick up records appended by other processes since the last scan."""
+        with self._lock:
+            if os.path.getsize(self.path) > len(self._mmap):
+                self._remap()
+                self._scan()
+
+    def _pack(self, username, face_encodings, voice_signature, passphrase, flags=0):
+        name = username.encode('utf-8')
+        phrase = (passphrase or "").encode('utf-8')
+        faces = np.asarray(face_encodings, dtype='<f4').reshape(-1, self.face_dim)
+        voice = np.asarray(voice_signature, dtype='<f4').reshape(self.voice_dim)
+
+        text = name + phrase
+        text += b"\0" * (-(RECORD.size + len(text)) % 4)
+        record_size = RECORD.size + len(text) + faces.nbytes + voice.nbytes
+
+        return (RECORD.pack(RECORD_MAGIC, record_size, len(name), len(phrase), len(faces), flags)
+                + text + faces.tobytes() + voice.tobytes())
+
+    @metrics.timed("store_write")
+    def _append(self, data):
+        with self._lock:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | getattr(os, 'O_BINARY', 0))
+            try:
+                view = memoryview(data)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            self._remap()
+            self._scan()
+
+    def add(self, username, face_encodings, voice_signature, passphrase=None, voiced_signature=True):
+        """Append (or replace) a user's templates.
+
+        Pass ``voiced_signature=False`` for a voice signature averaged over
+        every frame rather than only the voiced ones.
+        """
+        flags = FLAG_VOICED_SIGNATURE if voiced_signature else 0
+        self._append(self._pack(username, face_encodings, voice_signature, passphrase, flags))
+
+    def remove(self, username):
+        if username in self._offsets:
+            data = self._pack(username, np.empty((0, self.face_dim)), np.zeros(self.voice_dim), None, FLAG_DELETED)
+            self._append(data)
+
+    def get(self, username):
+        """O(1) lookup of a user's record, or None if not enrolled."""
+        offset = self._offsets.get(username)
+        if offset is None:
+            return None
+        buf = self._mmap
+
+        _, _, name_len, phrase_len, face_count, flags = RECORD.unpack_from(buf, offset)
+        text_start = offset + RECORD.size
+        phrase = buf[text_start + name_len:text_start + name_len + phrase_len].decode('utf-8')
+
+        data_start = text_start + name_len + phrase_len
+        data_start += -data_start % 4
+        faces = np.frombuffer(buf, dtype='<f4', count=face_count * self.face_dim, offset=data_start)
+        voice = np.frombuffer(buf, dtype='<f4', count=self.voice_dim, offset=data_start + faces.nbytes)
+
+        return EnrollmentRecord(username, faces.reshape(face_count, self.face_dim), voice, phrase or None,
+                                bool(flags & FLAG_VOICED_SIGNATURE))
+
+    def records(self):
+        for username in list(self._offsets):
+            yield self.get(username)
+
+
+def migrate_pickles(store, face_dir, voice_dir, remove=False):
+    """Copy users from the legacy per-user pickle layout into a store.
+
+    Returns the list of migrated usernames. Users already in the store are
+    skipped, so the migration can be re-run safely.
+    """
+    import pickle
+
+    migrated = []
+    if not os.path.isdir(face_dir):
+        return migrated
+
+    for filename in sorted(os.listdir(face_dir)):
+        if not filename.endswith(".pkl"):
+            continue
+        username = filename[:-len(".pkl")]
+        face_path = os.path.join(face_dir, filename)
+        voice_path = os.path.join(voice_dir, filename)
+
+        if username in store or not os.path.exists(voice_path):
+            continue
+
+        try:
+            with open(face_path, 'rb') as f:
+                face_encodings = pickle.load(f)
+            with open(voice_path, 'rb') as f:
+                voice_data = pickle.load(f)
+            # Pickled signatures were averaged over every frame
+            store.add(username, face_encodings, voice_data["signature"], voice_data.get("passphrase"),
+                      voiced_signature=False)
+        except Exception as e:
+            print(f"Error migrating {username}: {str(e)}")
+            continue
+
+        migrated.append(username)
+        if remove:
+            os.remove(face_path)
+            os.remove(voice_path)
+
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate per-user pickle files into the packed enrollment store")
+    parser.add_argument("--data-dir", default="auth_system_data")
+    parser.add_argument("--remove-pickles", action="store_true", help="delete the pickle files after migrating them")
+    args = parser.parse_args()
+
+    store = EnrollmentStore(os.path.join(args.data_dir, "enrollments.fvs"))
+    migrated = migrate_pickles(store,
+                               os.path.join(args.data_dir, "faces"),
+                               os.path.join(args.data_dir, "voices"),
+                               remove=args.remove_pickles)
+    print(f"Migrated {len(migrated)} users; the store now holds {len(store)} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bulk_enroll import load_audio, load_image
+
+_verifier = None
+
+
+def _init_worker(detector, detection_scale, quality_gate, sample_rate):
+    global _verifier
+    from face_detection import HogFaceDetector
+    from frame_quality import FrameQualityGate
+    from verification_engine import create_verifier
+
+    kwargs = {"sample_rate": sample_rate, "quality_gate": FrameQualityGate() if quality_gate else None}
+    if detector == "cascade":
+        # The labeled photos are unrelated to each other, so the app's detector minus its video-only stages
+        _verifier = create_verifier(tracking=False, motion_threshold=None, **kwargs)
+    else:
+        _verifier = create_verifier(detector=HogFaceDetector(scale=detection_scale), **kwargs)
+
+
+def _encode_sample(kind, path, max_size):
+    """(template, rejected, timings, error) for one image or clip, run in a worker."""
+    start = time.perf_counter()
+    try:
+        if kind == "face":
+            result = _verifier.enroll_face(load_image(path, max_size))
+        else:
+            result = _verifier.enroll_voice(load_audio(path, _verifier.sample_rate))
+    except Exception as e:
+        return None, "error", {}, str(e)
+    timings = dict(result.timings)
+    timings['total'] = time.perf_counter() - start
+    return result.template, result.rejected, timings, None
+
+
+def find_samples(root):
+    """(label, kind, path) for every image and WAV under ``<root>/<label>/``."""
+    samples = []
+    for label in sorted(os.listdir(root)):
+        label_dir = os.path.join(root, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for pattern in ("*.jpg", "*.jpeg", "*.png"):
+            samples.extend((label, "face", path) for path in sorted(glob.glob(os.path.join(label_dir, pattern))))
+        samples.extend((label, "voice", path) for path in sorted(glob.glob(os.path.join(label_dir, "*.wav"))))
+    return samples
+
+
+def trial_scores(templates, labels, block_size=1024):
+    """Distances of every genuine and impostor pair, as (genuine, impostor).
+
+    Each unordered pair is scored once. Distances are computed a block of
+    rows at a time from squared norms and one matrix product, so memory
+    stays at ``block_size`` x N.
+    """
+    templates = np.asarray(templates, dtype=np.float64)
+    labels = np.asarray(labels)
+    squared_norms = np.einsum('ij,ij->i', templates, templates)
+    genuine, impostor = [], []
+
+    for first in range(0, len(templates), block_size):
+        rows = slice(first, min(first + block_size, len(templates)))
+        squared = squared_norms[rows, None] + squared_norms[None, :] - 2.0 * templates[rows] @ templates.T
+        distances = np.sqrt(np.maximum(squared, 0.0))
+
+        row_ids = np.arange(rows.start, rows.stop)[:, None]
+        upper = np.arange(len(templates))[None, :] > row_ids
+        same = labels[rows, None] == labels[None, :]
+        genuine.append(distances[upper & same])
+        impostor.append(distances[upper & ~same])
+
+    return np.concatenate(genuine), np.concatenate(impostor)
+
+
+def error_rates(genuine, impostor, thresholds, inclusive=True):
+    """FAR and FRR at each threshold for distance scores (lower is more similar).
+
+    A trial is accepted when its distance is <= threshold, or < threshold
+    when ``inclusive`` is False.
+    """
+    side = 'right' if inclusive else 'left'
+    genuine, impostor = np.sort(genuine), np.sort(impostor)
+    thresholds = np.asarray(thresholds)
+    far = np.searchsorted(impostor, thresholds, side) / max(len(impostor), 1)
+    frr = 1.0 - np.searchsorted(genuine, thresholds, side) / max(len(genuine), 1)
+    return far, frr
+
+
+def operating_points(genuine, impostor, current, inclusive=True, far_targets=(0.01, 0.001), curve_points=200):
+    """EER, recommended thresholds and a FAR/FRR curve for one modality."""
+    # Every observed score is a candidate threshold, so the EER is exact
+    thresholds = np.unique(np.concatenate([genuine, impostor, [current]]))
+    far, frr = error_rates(genuine, impostor, thresholds, inclusive)
+
+    eer_at = int(np.argmin(np.abs(far - frr)))
+    report = {
+        "eer": float((far[eer_at] + frr[eer_at]) / 2),
+        "recommended": {
+            "eer": {"threshold": float(thresholds[eer_at]), "far": float(far[eer_at]), "frr": float(frr[eer_at])},
+        },
+    }
+
+    current_at = int(np.searchsorted(thresholds, current))
+    report["current"] = {"threshold": current, "far": float(far[current_at]), "frr": float(frr[current_at])}
+
+    for target in far_targets:
+        allowed = np.nonzero(far <= target)[0]
+        if len(allowed):
+            best = int(allowed[-1])
+            report["recommended"][f"far<={target:g}"] = {"threshold": float(thresholds[best]),
+                                                         "far": float(far[best]), "frr": float(frr[best])}
+
+    curve_at = np.unique(np.linspace(0, len(thresholds) - 1, min(curve_points, len(thresholds))).astype(int))
+    report["curve"] = {"threshold": thresholds[curve_at].tolist(),
+                       "far": far[curve_at].tolist(),
+                       "frr": frr[curve_at].tolist()}
+    return report
+
+
+def latency_summary(timings):
+    """Mean and percentiles in milliseconds for each stage in a list of timing dicts."""
+    summary = {}
+    for stage in sorted({stage for item in timings for stage in item}):
+        ms = np.array([item[stage] for item in timings if stage in item]) * 1000.0
+        summary[stage] = {"count": int(len(ms)), "mean_ms": float(ms.mean()),
+                          "p50_ms": float(np.percentile(ms, 50)),
+                          "p90_ms": float(np.percentile(ms, 90)),
+                          "p99_ms": float(np.percentile(ms, 99))}
+    return summary
+
+
+def evaluate(root, workers=1, detector="cascade", detection_scale=1.0, quality_gate=False,
+             sample_rate=16000, max_size=1024, far_targets=(0.01, 0.001)):
+    """Encode every sample under ``root`` and score all genuine/impostor pairs.
+
+    Returns the report as a dict with one section per modality.
+    """
+    from verification_engine import FaceVoiceVerifier
+
+    samples = find_samples(root)
+    report = {"root": os.path.abspath(root), "detector": detector, "detection_scale": detection_scale,
+              "quality_gate": quality_gate, "workers": workers}
+
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(detector, detection_scale, quality_gate, sample_rate)) as executor:
+        for kind, current, inclusive in (("face", FaceVoiceVerifier.FACE_TOLERANCE, True),
+                                         ("voice", FaceVoiceVerifier.VOICE_THRESHOLD, False)):
+            items = [(label, path) for label, sample_kind, path in samples if sample_kind == kind]
+            if not items:
+                continue
+
+            start = time.perf_counter()
+            outputs = list(executor.map(_encode_sample, [kind] * len(items), [path for _, path in items],
+                                        [max_size] * len(items)))
+            elapsed = time.perf_counter() - start
+
+            labels = [label for (label, _), output in zip(items, outputs) if output[0] is not None]
+            templates = [output[0] for output in outputs if output[0] is not None]
+            rejected = {}
+            errors = []
+            for (_, path), (template, reason, _, error) in zip(items, outputs):
+                if template is None:
+                    rejected[reason or "no_face"] = rejected.get(reason or "no_face", 0) + 1
+                if error is not None:
+                    errors.append({"path": path, "error": error})
+
+            section = {
+                "samples": len(items),
+                "failed_to_encode": rejected,
+                "errors": errors,
+                "labels": len(set(labels)),
+                "throughput_per_second": len(items) / elapsed if elapsed else 0.0,
+                "latency": latency_summary([output[2] for output in outputs]),
+            }
+
+            start = time.perf_counter()
+            genuine, impostor = trial_scores(templates, labels) if templates else (np.zeros(0), np.zeros(0))
+            section["scoring_seconds"] = time.perf_counter() - start
+            section["genuine_trials"] = int(len(genuine))
+            section["impostor_trials"] = int(len(impostor))
+            if len(genuine) and len(impostor):
+                section.update(operating_points(genuine, impostor, current, inclusive, far_targets))
+            report[kind] = section
+
+    return report
+
+
+def print_summary(report):
+    for kind in ("face", "voice"):
+        section = report.get(kind)
+        if section is None:
+            continue
+        print(f"{kind}: {section['samples']} samples of {section['labels']} labels, "
+              f"{section['throughput_per_second']:.1f}/s, {section['genuine_trials']} genuine and "
+              f"{section['impostor_trials']} impostor trials scored in {section['scoring_seconds'] * 1000:.1f} ms")
+        if section["failed_to_encode"]:
+            print(f"  failed to encode: {section['failed_to_encode']}")
+        for error in section["errors"]:
+            print(f"  {error['path']}: {error['error']}")
+        for stage, stats in section["latency"].items():
+            print(f"  {stage}: mean {stats['mean_ms']:.2f} ms, p50 {stats['p50_ms']:.2f} ms, "
+                  f"p99 {stats['p99_ms']:.2f} ms")
+        if "eer" not in section:
+            print("  not enough genuine and impostor trials for error rates")
+            continue
+        current = section["current"]
+        print(f"  EER {section['eer']:.4f}; current threshold {current['threshold']:g}: "
+              f"FAR {current['far']:.4f}, FRR {current['frr']:.4f}")
+        for name, point in section["recommended"].items():
+            print(f"  recommended ({name}): threshold {point['threshold']:.4f}, "
+                  f"FAR {point['far']:.4f}, FRR {point['frr']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure face and voice FAR/FRR and latency on a labeled <root>/<label>/{*.jpg,*.wav} set")
+    parser.add_argument("root", help="directory with one subdirectory per person")
+    parser.add_argument("--output", default="evaluation_report.json", help="where to write the JSON report")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes; 1 gives the cleanest latency figures")
+    parser.add_argument("--detector", choices=("cascade", "hog"), default="cascade")
+    parser.add_argument("--detection-scale", type=float, default=1.0, help="HOG detection scale (--detector hog)")
+    parser.add_argument("--quality-gate", action="store_true", help="apply the frame quality gate")
+    parser.add_argument("--sample-rate", type=int, default=16000)
+    parser.add_argument("--max-size", type=int, default=1024)
+    parser.add_argument("--far-targets", type=float, nargs="+", default=[0.01, 0.001])
+    args = parser.parse_args()
+
+    report = evaluate(args.root, workers=args.workers, detector=args.detector,
+                      detection_scale=args.detection_scale, quality_gate=args.quality_gate,
+                      sample_rate=args.sample_rate, max_size=args.max_size,
+                      far_targets=tuple(args.far_targets))
+    print_summary(report)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import cv2
+import numpy as np
+import face_recognition
+
+
+def load_haar_cascade():
+    """Load OpenCV's bundled frontal-face Haar cascade."""
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+
+def scale_locations(face_locations, scale, frame_shape):
+    """Map (top, right, bottom, left) boxes found at ``scale`` back to full resolution."""
+    height, width = frame_shape[:2]
+    return [(max(0, int(round(top / scale))),
+             min(width, int(round(right / scale))),
+             min(height, int(round(bottom / scale))),
+             max(0, int(round(left / scale))))
+            for (top, right, bottom, left) in face_locations]
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class HogFaceDetector:
+    """dlib face detection, optionally run on a downscaled copy of the frame.
+
+    Boxes are always returned in full-resolution coordinates so encodings
+    can still be computed on the full-quality crop.
+    """
+
+    def __init__(self, scale=1.0, upsample=1, model="hog"):
+        self.scale = scale
+        self.upsample = upsample
+        self.model = model
+
+    def detect(self, rgb_frame):
+        if self.scale == 1.0:
+            return face_recognition.face_locations(rgb_frame, self.upsample, self.model)
+
+        small_frame = cv2.resize(rgb_frame, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        face_locations = face_recognition.face_locations(small_frame, self.upsample, self.model)
+        return scale_locations(face_locations, self.scale, rgb_frame.shape)
+
+
+class CascadeFaceDetector:
+    """Staged face detection that spends CPU only on frames likely to hold a face.
+
+    1. Optional motion gate: a frame that barely differs from the previous
+       one, which had no candidates, is rejected without further work.
+    2. Haar cascade on a small grayscale copy proposes candidate regions.
+    3. HOG runs only inside the (padded) candidate regions.
+    4. Optional CNN runs on the candidate regions when HOG finds nothing.
+
+    ``counters`` records how many frames each stage rejected or accepted.
+    """
+
+    def __init__(self, haar_cascade, hog=None, use_cnn=False, motion_threshold=None,
+                 haar_scale=0.5, roi_margin=0.3):
+        self.haar_cascade = haar_cascade
+        self.hog = hog or HogFaceDetector()
+        self.use_cnn = use_cnn
+        self.motion_threshold = motion_threshold
+        self.haar_scale = haar_scale
+        self.roi_margin = roi_margin
+        self._previous_thumbnail = None
+        self._previous_had_candidates = True
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.counters = {
+            "frames": 0,
+            "motion_rejected": 0,
+            "haar_rejected": 0,
+            "hog_accepted": 0,
+            "cnn_accepted": 0,
+            "final_rejected": 0,
+        }
+
+    def stats(self):
+        return dict(self.counters)
+
+    def _motion_rejects(self, gray):
+        thumbnail = cv2.resize(gray, (80, 60), interpolation=cv2.INTER_AREA).astype(np.int16)
+        previous = self._previous_thumbnail
+        self._previous_thumbnail = thumbnail
+        if previous is None or self._previous_had_candidates:
+            return False
+        return float(np.mean(np.abs(thumbnail - previous))) < self.motion_threshold
+
+    def _candidate_regions(self, gray, frame_shape):
+        small_gray = cv2.resize(gray, (0, 0), fx=self.haar_scale, fy=self.haar_scale, interpolation=cv2.INTER_AREA)
+        candidates = self.haar_cascade.detectMultiScale(small_gray, scaleFactor=1.1, minNeighbors=3, minSize=(24, 24))
+
+        height, width = frame_shape[:2]
+        regions = []
+        for (x, y, w, h) in candidates:
+            x, y, w, h = (v / self.haar_scale for v in (x, y, w, h))
+            pad_x, pad_y = w * self.roi_margin, h * self.roi_margin
+            regions.append((max(0, int(y - pad_y)), min(width, int(x + w + pad_x)),
+                            min(height, int(y + h + pad_y)), max(0, int(x - pad_x))))
+        return regions
+
+    def _detect_in_regions(self, rgb_frame, regions, detect):
+        boxes = []
+        for (top, right, bottom, left) in regions:
+            crop = np.ascontiguousarray(rgb_frame[top:bottom, left:right])
+            for (t, r, b, l) in detect(crop):
+                box = (t + top, r + left, b + top, l + left)
+                if not any(box_iou(box, other) > 0.5 for other in boxes):
+                    boxes.append(box)
+        return boxes
+
+    def detect(self, rgb_frame):
+        self.counters["frames"] += 1
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+
+        if self.motion_threshold is not None and self._motion_rejects(gray):
+            self.counters["motion_rejected"] += 1
+            return []
+
+        regions = self._candidate_regions(gray, rgb_frame.shape)
+        self._previous_had_candidates = bool(regions)
+        if not regions:
+            self.counters["haar_rejected"] += 1
+            return []
+
+        boxes = self._detect_in_regions(rgb_frame, regions, self.hog.detect)
+        if boxes:
+            self.counters["hog_accepted"] += 1
+            return boxes
+
+        if self.use_cnn:
+            boxes = self._detect_in_regions(rgb_frame, regions,
+                                            lambda crop: face_recognition.face_locations(crop, 1, "cnn"))
+            if boxes:
+                self.counters["cnn_accepted"] += 1
+                return boxes
+
+        self.counters["final_rejected"] += 1
+        return []
@@ -0,0 +1,181 @@
+import os
+import threading
+
+import numpy as np
+
+
+class FaceIndex:
+    """1:N face identification over every enrolled encoding.
+
+    Encodings are kept in one contiguous, memory-mapped float32 matrix
+    (``encodings.f32``) with a parallel row-to-user map (``users.txt``, one
+    username per row). Adding a user writes its rows in place and then
+    appends the usernames, so a crash never exposes half-written rows.
+    """
+
+    def __init__(self, index_dir, dim=128, initial_capacity=1024):
+        self.index_dir = index_dir
+        self.dim = dim
+        self.matrix_path = os.path.join(index_dir, "encodings.f32")
+        self.users_path = os.path.join(index_dir, "users.txt")
+        self._lock = threading.Lock()
+
+        os.makedirs(index_dir, exist_ok=True)
+
+        self._users_size = 0
+        self.row_users = self._read_new_users()
+        self._users = set(self.row_users)
+
+        row_bytes = dim * np.dtype(np.float32).itemsize
+        existing_rows = os.path.getsize(self.matrix_path) // row_bytes if os.path.exists(self.matrix_path) else 0
+        capacity = max(initial_capacity, existing_rows, len(self.row_users))
+        self._open_matrix(capacity)
+
+        # Squared row norms let identify() reduce to one matrix-vector product
+        self._sq_norms = np.einsum('ij,ij->i', self.matrix[:len(self.row_users)],
+                                   self.matrix[:len(self.row_users)])
+
+    def __len__(self):
+        return len(self.row_users)
+
+    def __contains__(self, username):
+        return username in self._users
+
+    def _read_new_users(self):
+        """Usernames appended to users.txt since the last read; a line still being written is left for later."""
+        if not os.path.exists(self.users_path):
+            return []
+        with open(self.users_path, 'rb') as f:
+            f.seek(self._users_size)
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        self._users_size += len(complete)
+        return [line.rstrip('\r') for line in complete.decode('utf-8').split('\n') if line.strip()]
+
+    def refresh(self):
+        """Pick up users indexed by other processes since the last read.
+
+        Rows are written before their usernames, so every new username
+        already has its row in the matrix file.
+        """
+        if not os.path.exists(self.users_path) or os.path.getsize(self.users_path) == self._users_size:
+            return
+        with self._lock:
+            self._catch_up()
+
+    def _catch_up(self):
+        """refresh() with the lock held."""
+        usernames = self._read_new_users()
+        if not usernames:
+            return
+        start = len(self.row_users)
+        end = start + len(usernames)
+        if end > self.capacity:
+            # Another process grew the file
+            del self.matrix
+            self._open_matrix(end)
+        rows = np.asarray(self.matrix[start:end])
+        self.row_users.extend(usernames)
+        self._users.update(usernames)
+        self._sq_norms = np.concatenate([self._sq_norms, np.einsum('ij,ij->i', rows, rows)])
+
+    def _open_matrix(self, capacity):
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        with open(self.matrix_path, 'ab') as f:
+            # Never shrink: another process may have grown the file for rows not read yet
+            capacity = max(capacity, os.fstat(f.fileno()).st_size // row_bytes)
+            f.truncate(capacity * row_bytes)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def add(self, username, encodings):
+        """Append a user's encodings to the matrix and the row map."""
+        self.add_many([(username, encodings)])
+
+    def add_many(self, users):
+        """Append several (username, encodings) pairs with a single sync."""
+        blocks = [np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim) for _, encodings in users]
+        if not blocks:
+            return
+        rows = np.concatenate(blocks)
+        usernames = [username for (username, _), block in zip(users, blocks) for _ in range(len(block))]
+
+        with self._lock:
+            # Rows added by another process go first, so they are not overwritten
+            self._catch_up()
+            start = len(self.row_users)
+            end = start + len(rows)
+
+            if end > self.capacity:
+                self.matrix.flush()
+                del self.matrix
+                self._open_matrix(max(end, self.capacity * 2))
+
+            self.matrix[start:end] = rows
+            self.matrix.flush()
+
+            lines = ''.join(f"{username}\n" for username in usernames).encode('utf-8')
+            with open(self.users_path, 'ab') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._users_size += len(lines)
+
+            self.row_users.extend(usernames)
+            self._users.update(usernames)
+            self._sq_norms = np.concatenate([self._sq_norms, np.einsum('ij,ij->i', rows, rows)])
+
+    def sync(self, store):
+        """Add every user in an EnrollmentStore that is not indexed yet; returns how many were added.
+
+        Catches up with users enrolled before the index existed, or stored
+        by an interrupted run before their index rows were written.
+        """
+        missing = [(record.username, record.face_encodings) for record in store.records()
+                   if record.username not in self]
+        self.add_many(missing)
+        return len(missing)
+
+    def identify(self, encoding, tolerance=0.5):
+        """Return (username, distance) of the closest enrolled encoding.
+
+        The username is None when the index is empty or the closest
+        encoding is farther than ``tolerance``.
+        """
+        query = np.asarray(encoding, dtype=np.float32)
+
+        with self._lock:
+            count = len(self.row_users)
+            if count == 0:
+                return None, None
+
+            # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, evaluated for all rows at once
+            sq_distances = self._sq_norms - 2.0 * (self.matrix[:count] @ query)
+            best = int(np.argmin(sq_distances))
+            distance = float(np.sqrt(max(sq_distances[best] + float(query @ query), 0.0)))
+            username = self.row_users[best]
+
+        if distance > tolerance:
+            return None, distance
+        return username, distance
+
+    def identify_batch(self, encodings, tolerance=0.5):
+        """identify() for several queries with a single matrix product.
+
+        Returns a list of (username, distance) pairs in query order.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+
+        with self._lock:
+            count = len(self.row_users)
+            if count == 0:
+                return [(None, None)] * len(queries)
+
+            sq_distances = self._sq_norms[None, :] - 2.0 * (queries @ self.matrix[:count].T)
+            best = np.argmin(sq_distances, axis=1)
+            sq_best = sq_distances[np.arange(len(queries)), best] + np.einsum('ij,ij->i', queries, queries)
+            distances = np.sqrt(np.maximum(sq_best, 0.0))
+            usernames = [self.row_users[row] for row in best]
+
+        return [(username if distance <= tolerance else None, float(distance))
+                for username, distance in zip(usernames, distances)]
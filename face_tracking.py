@@ -0,0 +1,79 @@
+import cv2
+
+
+class TrackingFaceDetector:
+    """Detect a face once, then follow it by template matching.
+
+    Wraps any detector with a ``detect(rgb_frame)`` method and returns boxes
+    in the same (top, right, bottom, left) form, so it can be handed to
+    FaceVoiceVerifier as its detector. The wrapped detector runs again when
+    the match score falls below ``min_confidence`` or after
+    ``redetect_interval`` tracked frames. Call reset() between sessions.
+    """
+
+    def __init__(self, detector, redetect_interval=10, min_confidence=0.6, search_margin=0.5):
+        self.detector = detector
+        self.redetect_interval = redetect_interval
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.counters = {"detected": 0, "tracked": 0, "lost": 0}
+        self.reset()
+
+    def reset(self):
+        self._box = None
+        self._template = None
+        self._tracked_frames = 0
+
+    def reset_counters(self):
+        self.counters = {"detected": 0, "tracked": 0, "lost": 0}
+        if hasattr(self.detector, "reset_counters"):
+            self.detector.reset_counters()
+
+    def stats(self):
+        stats = dict(self.counters)
+        if hasattr(self.detector, "stats"):
+            stats.update(self.detector.stats())
+        return stats
+
+    def _start_track(self, gray, box):
+        top, right, bottom, left = box
+        self._box = box
+        self._template = gray[top:bottom, left:right].copy()
+        self._tracked_frames = 0
+
+    def _track(self, gray):
+        top, right, bottom, left = self._box
+        height, width = gray.shape
+        pad_y = int((bottom - top) * self.search_margin)
+        pad_x = int((right - left) * self.search_margin)
+        win_top, win_left = max(0, top - pad_y), max(0, left - pad_x)
+        window = gray[win_top:min(height, bottom + pad_y), win_left:min(width, right + pad_x)]
+
+        th, tw = self._template.shape
+        if window.shape[0] < th or window.shape[1] < tw:
+            return None
+
+        scores = cv2.matchTemplate(window, self._template, cv2.TM_CCOEFF_NORMED)
+        _, confidence, _, (x, y) = cv2.minMaxLoc(scores)
+        if confidence < self.min_confidence:
+            return None
+        return (win_top + y, win_left + x + tw, win_top + y + th, win_left + x)
+
+    def detect(self, rgb_frame):
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+
+        if self._box is not None and self._tracked_frames < self.redetect_interval:
+            box = self._track(gray)
+            if box is not None:
+                self._box = box
+                self._tracked_frames += 1
+                self.counters["tracked"] += 1
+                return [box]
+            self.counters["lost"] += 1
+
+        self.reset()
+        face_locations = self.detector.detect(rgb_frame)
+        if face_locations:
+            self.counters["detected"] += 1
+            self._start_track(gray, face_locations[0])
+        return face_locations
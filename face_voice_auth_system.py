@@ -1,22 +1,57 @@
 import os
-import pickle
-import cv2
-import numpy as np
-import face_recognition
-import sounddevice as sd
-import soundfile as sf
-import librosa
+import argparse
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
 import threading
 import time
-import shutil
 from datetime import datetime
 
+import lazy_imports
+from camera_manager import CameraManager
+from metrics import metrics
+from enrollment_store import EnrollmentStore, migrate_pickles
+from face_index import FaceIndex
+from file_store import ChunkedFileStore, DirectoryFileStore
+from template_cache import TemplateCache
+from transfer_manager import TransferManager
+from voice_index import VoiceIndex
+
+# OpenCV, dlib, the audio libraries and the modules built on them are only
+# imported when first needed (or by the warm-up thread), see lazy_imports.py
+
+# Remembered camera index and resolution
+CAMERA_SETTINGS = os.path.join("auth_system_data", "camera.json")
+
+
+def default_frame_source():
+    return lazy_imports.load("media_sources").CameraSource(settings_path=CAMERA_SETTINGS)
+
+
+def format_size(size):
+    if size < 1024:
+        return f"{size:.0f} B"
+    elif size < 1024 * 1024:
+        return f"{size/1024:.1f} KB"
+    elif size < 1024 * 1024 * 1024:
+        return f"{size/(1024*1024):.1f} MB"
+    return f"{size/(1024*1024*1024):.2f} GB"
+
 class ModernUI(tk.Tk):
-    def __init__(self):
+    def __init__(self, warm_up=True, profile_startup=False, metrics_file=None, metrics_interval=10.0,
+                 frame_source=None, audio_source=None, camera_idle_timeout=60.0, preview_fps=15,
+                 voice_cohort_z=None, chunked_files=False):
+        self.startup_started = time.perf_counter()
+        self.startup_phases = []
+        self.profile_startup = profile_startup
+        # Without warm-up the libraries are imported on first use; their times are printed on exit
+        self.import_times_printed = False
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        # Callables returning an unopened FrameSource / AudioSource(sample_rate); live devices by default
+        self.frame_source = frame_source or default_frame_source
+        self.audio_source = audio_source or (lambda rate: lazy_imports.load("media_sources").MicrophoneSource(rate))
         super().__init__()
+        self.mark_startup_phase("tk")
         
         self.title("Secure Authentication System")
         self.geometry("900x600")
@@ -30,7 +65,10 @@ class ModernUI(tk.Tk):
         
         # Initialize variables
         self.current_user = None
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self._verifier = None
+        self._voice_stream = None
+        self._engine_lock = threading.Lock()
+        self._workers_lock = threading.Lock()
         self.face_data_dir = os.path.join("auth_system_data", "faces")
         self.voice_data_dir = os.path.join("auth_system_data", "voices")
         self.files_dir = os.path.join("auth_system_data", "user_files")
@@ -39,6 +77,33 @@ class ModernUI(tk.Tk):
         for directory in [self.face_data_dir, self.voice_data_dir, self.files_dir]:
             os.makedirs(directory, exist_ok=True)
         
+        # User files as plain copies, or deduplicated chunks shared between all users
+        if chunked_files:
+            self.file_store = ChunkedFileStore(os.path.join("auth_system_data", "chunk_store"))
+        else:
+            self.file_store = DirectoryFileStore(self.files_dir)
+        
+        # Uploads and downloads stream on worker threads; the progress poll updates each finished one's row
+        self.transfers = TransferManager(self.file_store)
+        self.transfer_polling = False
+        
+        # Packed store of every user's face and voice templates
+        self.store = EnrollmentStore(os.path.join("auth_system_data", "enrollments.fvs"))
+        if len(self.store) == 0:
+            migrate_pickles(self.store, self.face_data_dir, self.voice_data_dir)
+        self.templates = TemplateCache(self.store)
+        self.mark_startup_phase("store")
+        
+        # 1:N index of every enrolled face encoding for username-free login
+        self.face_index = FaceIndex(os.path.join("auth_system_data", "face_index"))
+        self.face_index.sync(self.store)
+        self.mark_startup_phase("face_index")
+        
+        # Every voice signature, to check a voice is not closer to other users than to the claimed one
+        self.voice_cohort_z = voice_cohort_z
+        self.voice_index = VoiceIndex.from_store(self.store) if voice_cohort_z is not None else None
+        self.mark_startup_phase("voice_index")
+        
         # Configure style
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -61,14 +126,105 @@ class ModernUI(tk.Tk):
                             font=('Helvetica', 14),
                             background='#f0f0f0')
         
+        self.mark_startup_phase("styles")
+        
         # Create and show the login frame
         self.show_login_frame()
-        
-        # Video capture properties
-        self.cap = None
+        self.mark_startup_phase("login_frame")
+        self.after_idle(self.on_first_window, warm_up)
+        if self.metrics_file:
+            self.after(int(self.metrics_interval * 1000), self.export_metrics)
+        
+        # Video capture properties; the camera stays open across screens until idle
+        self.camera = CameraManager(self.frame_source, idle_timeout=camera_idle_timeout)
+        self.grabber = None
         self.is_capturing = False
-        self.camera_thread = None
         
+        # The preview is redrawn at its own rate, whatever the recognition throughput
+        self.preview_fps = preview_fps
+        self.preview = None
+        
+        # Face detection and encoding run in worker processes, started on first use
+        self.face_workers = None
+        self.pipeline = None
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def mark_startup_phase(self, name):
+        self.startup_phases.append((name, time.perf_counter()))
+    
+    def on_first_window(self, warm_up):
+        self.update_idletasks()
+        self.mark_startup_phase("first_window")
+        if self.profile_startup:
+            print(self.format_startup_profile())
+        
+        # Load the heavy libraries while the user is still typing their name
+        if warm_up:
+            lazy_imports.warm_up(on_done=self.on_warm_up_done)
+    
+    def on_warm_up_done(self, errors):
+        for name, error in errors.items():
+            print(f"Warm-up could not import {name}: {error}")
+        if not errors:
+            # Pay first-call costs now and keep the warmed workers for every later session
+            self.verifier.warm_up(face=False)
+            self.start_face_workers()
+        if self.profile_startup:
+            print("Warm-up imports:")
+            print(lazy_imports.format_import_times())
+            self.import_times_printed = True
+    
+    def format_startup_profile(self):
+        lines = ["Startup phases:"]
+        previous = self.startup_started
+        for name, finished in self.startup_phases:
+            lines.append(f"  {name}: {(finished - previous) * 1000:.1f} ms")
+            previous = finished
+        lines.append(f"Time to first window: {(previous - self.startup_started) * 1000:.1f} ms")
+        return "\n".join(lines)
+    
+    @property
+    def verifier(self):
+        self.load_verifier()
+        return self._verifier
+    
+    @property
+    def voice_stream(self):
+        self.load_verifier()
+        return self._voice_stream
+    
+    def load_verifier(self):
+        # Built on first use, or earlier by the warm-up thread
+        with self._engine_lock:
+            if self._verifier is None:
+                create_verifier = lazy_imports.load("verification_engine").create_verifier
+                StreamingVoiceVerifier = lazy_imports.load("voice_stream").StreamingVoiceVerifier
+                self._verifier = create_verifier()
+                self._voice_stream = StreamingVoiceVerifier(self._verifier)
+    
+    def export_metrics(self, reschedule=True):
+        try:
+            metrics.export(self.metrics_file)
+        except OSError as e:
+            print(f"Error exporting metrics: {str(e)}")
+        if reschedule:
+            self.after(int(self.metrics_interval * 1000), self.export_metrics)
+    
+    def on_close(self):
+        self.is_capturing = False
+        with self._workers_lock:
+            if self.face_workers is not None:
+                self.face_workers.stop()
+        self.camera.close()
+        # Workers stop at their next chunk; waiting for them here would only hold up the window
+        self.transfers.shutdown(wait=False)
+        if self.metrics_file:
+            self.export_metrics(reschedule=False)
+        if self.profile_startup and not self.import_times_printed:
+            print("Imports on first use:")
+            print(lazy_imports.format_import_times() or "  none")
+        self.destroy()
+    
     def show_login_frame(self):
         # Clear any existing frames
         for widget in self.winfo_children():
@@ -102,6 +258,9 @@ class ModernUI(tk.Tk):
         login_btn = ttk.Button(button_frame, text="Login", command=self.start_auth)
         login_btn.grid(row=0, column=1, padx=10)
         
+        face_login_btn = ttk.Button(button_frame, text="Login with Face", command=self.start_face_login)
+        face_login_btn.grid(row=0, column=2, padx=10)
+        
         # Footer
         footer_frame = ttk.Frame(main_frame)
         footer_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
@@ -117,10 +276,7 @@ class ModernUI(tk.Tk):
             return
             
         # Check if username already exists
-        face_path = os.path.join(self.face_data_dir, f"{username}.pkl")
-        voice_path = os.path.join(self.voice_data_dir, f"{username}.pkl")
-        
-        if os.path.exists(face_path) or os.path.exists(voice_path):
+        if username in self.store:
             messagebox.showerror("Error", "Username already exists")
             return
             
@@ -172,109 +328,176 @@ class ModernUI(tk.Tk):
         self.status_label = ttk.Label(main_frame, text="Ready to begin registration")
         self.status_label.pack(pady=10)
         
-    def start_face_capture(self):
+    @metrics.timed("camera_open")
+    def open_camera(self):
         self.status_label.config(text="Initializing camera...")
         
-        # Try multiple camera indices
-        self.cap = None
-        
-        # Try to open the front camera (usually index 0 or 1)
-        for camera_index in [0, 1, 2]:
-            try:
-                temp_cap = cv2.VideoCapture(camera_index)
-                if temp_cap.isOpened():
-                    # Test if we can actually read a frame
-                    ret, _ = temp_cap.read()
-                    if ret:
-                        self.cap = temp_cap
-                        self.camera_index = camera_index
-                        self.status_label.config(text=f"Camera {camera_index} opened successfully")
-                        break
-                    else:
-                        temp_cap.release()
-            except Exception as e:
-                print(f"Error trying camera {camera_index}: {str(e)}")
-                
-        if self.cap is None:
+        # Reuses the open camera when there is one; a replay source reads its file instead
+        try:
+            self.grabber = self.camera.acquire()
+        except Exception as e:
+            print(f"Error opening camera: {str(e)}")
             messagebox.showerror("Error", "Could not open any camera. Please check your camera connections and permissions.")
             self.status_label.config(text="Camera initialization failed")
-            return
+            return False
         
-        # Set camera properties for better quality
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        camera_index = getattr(self.camera.source, "index", None)
+        if camera_index is not None:
+            self.status_label.config(text=f"Camera {camera_index} opened successfully")
+        
+        PreviewRenderer = lazy_imports.load("preview_renderer").PreviewRenderer
+        self.preview = PreviewRenderer(self.camera_label, self.grabber, max_fps=self.preview_fps)
+        self.preview.start()
+        return True
+    
+    def close_camera(self):
+        if self.preview is not None:
+            self.preview.stop()
+            self.preview = None
+        self.camera.release()
+    
+    def start_face_capture(self):
+        if not self.open_camera():
+            return
         
         self.is_capturing = True
         self.face_embeddings = []
+        self.max_face_captures = 5
         self.face_capture_btn.config(text="Capturing...", state='disabled')
         
-        # Start camera in a separate thread
-        self.camera_thread = threading.Thread(target=self.capture_face)
-        self.camera_thread.daemon = True
-        self.camera_thread.start()
+        # Grab a short burst of frames, then encode them in parallel
+        self.start_face_workers()
+        self.burst_frames = []
+        self.burst_size = 15
+        self.burst_interval = 0.1
+        self.burst_started = time.perf_counter()
+        self.after(30, self.capture_face)
     
-    def capture_face(self):
-        capture_count = 0
-        max_captures = 5
-        processing = False
-        
-        while self.is_capturing and capture_count < max_captures:
-            try:
-                ret, frame = self.cap.read()
-                if not ret:
-                    continue
-                
-                # Flip horizontally for a mirror effect
-                frame = cv2.flip(frame, 1)
-                
-                # Convert to RGB for face_recognition
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                # Display the frame
-                img = Image.fromarray(rgb_frame)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.camera_label.imgtk = imgtk
-                self.camera_label.config(image=imgtk)
-                self.update()
-                
-                # Process every few frames to avoid high CPU usage
-                if not processing and capture_count < max_captures:
-                    processing = True
-                    
-                    # Detect faces
-                    face_locations = face_recognition.face_locations(rgb_frame)
-                    
-                    if face_locations:
-                        # Get face encodings
-                        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                        
-                        if face_encodings:
-                            self.face_embeddings.append(face_encodings[0])
-                            capture_count += 1
-                            self.status_label.config(text=f"Captured face {capture_count}/{max_captures}")
+    def start_face_workers(self):
+        # Called from the warm-up thread as well as on first capture
+        with self._workers_lock:
+            if self.face_workers is None:
+                face_workers = lazy_imports.load("capture_pipeline").FaceWorkerPool()
+                face_workers.start()
+                self.face_workers = face_workers
+    
+    def show_detection(self, result):
+        # Boxes are drawn by the preview loop over whatever frame it shows next
+        rgb_frame = self.pipeline.latest_frame()
+        if result is None or result.face_location is None or rgb_frame is None:
+            return
+        preview_renderer = lazy_imports.load("preview_renderer")
+        if result.rejected:
+            color = preview_renderer.BOX_REJECTED
+        elif getattr(result, "accepted", True):
+            color = preview_renderer.BOX_ACCEPTED
+        else:
+            color = preview_renderer.BOX_NO_MATCH
+        self.preview.set_boxes([result.face_location], rgb_frame.shape, color)
+    
+    def start_face_pipeline(self, mode, payload, handle_result, finish, max_attempts=None):
+        self.start_face_workers()
+        
+        CapturePipeline = lazy_imports.load("capture_pipeline").CapturePipeline
+        self.pipeline = CapturePipeline(None, self.face_workers, mode, payload, grabber=self.grabber)
+        self.pipeline.start()
+        self.face_attempts = 0
+        self.face_rejections = 0
+        self.after(30, self.poll_face_pipeline, handle_result, finish, max_attempts)
+    
+    def poll_face_pipeline(self, handle_result, finish, max_attempts):
+        try:
+            if self.is_capturing:
+                for item in self.pipeline.poll():
+                    self.show_detection(item.result)
+                    if item.result is not None and item.result.rejected:
+                        # Unusable frames never reached the encoder and do not use up an attempt
+                        self.face_rejections += 1
+                        hints = lazy_imports.load("frame_quality").REJECTION_HINTS
+                        self.status_label.config(text=hints.get(item.result.rejected, "Adjusting..."))
+                        if max_attempts and self.face_rejections >= max_attempts * 5:
+                            self.is_capturing = False
+                            break
+                        continue
                     
-                    processing = False
-                
-                time.sleep(0.1)  # Small delay to reduce CPU usage
-
-            except Exception as e:
-                print(f"Error in face capture: {str(e)}")
-                self.status_label.config(text=f"Error: {str(e)}")
-                break
+                    self.face_attempts += 1
+                    if item.error:
+                        print(f"Error in face processing: {item.error}")
+                    elif handle_result(item.result):
+                        self.is_capturing = False
+                        break
+                    if max_attempts and self.face_attempts >= max_attempts:
+                        self.is_capturing = False
+                        break
+        except Exception as e:
+            print(f"Error in face capture: {str(e)}")
+            self.is_capturing = False
+        
+        if self.is_capturing:
+            self.after(30, self.poll_face_pipeline, handle_result, finish, max_attempts)
+            return
+        
+        # Cleanup
+        self.pipeline.stop()
+        self.close_camera()
+        
+        try:
+            finish()
+        except tk.TclError:
+            pass  # The screen was left while capturing
     
+    def capture_face(self):
+        try:
+            if self.is_capturing:
+                # Keep frames spaced out so the burst covers small pose changes
+                last_id = self.burst_frames[-1][0] if self.burst_frames else 0
+                item = self.grabber.latest(last_id, timeout=0)
+                if item is not None:
+                    if not self.burst_frames or item[1] - self.burst_frames[-1][1] >= self.burst_interval:
+                        self.burst_frames.append(item)
+                        self.status_label.config(text=f"Capturing frame {len(self.burst_frames)}/{self.burst_size}")
+                
+                if len(self.burst_frames) < self.burst_size:
+                    self.after(30, self.capture_face)
+                    return
+        except Exception as e:
+            print(f"Error in face capture: {str(e)}")
+            self.is_capturing = False
+        
         # Cleanup
-        if self.cap:
-            self.cap.release()
+        self.close_camera()
+        
+        if not self.is_capturing:
+            return  # The screen was left while capturing
         self.is_capturing = False
         
-        if capture_count >= max_captures:
-            self.status_label.config(text="Face capture completed successfully")
+        self.status_label.config(text=f"Encoding {len(self.burst_frames)} frames...")
+        frames = [rgb_frame for _, _, rgb_frame in self.burst_frames]
+        threading.Thread(target=self.encode_face_burst, args=(frames,), daemon=True).start()
+    
+    def encode_face_burst(self, frames):
+        try:
+            with metrics.span("face_enroll_burst"):
+                results = self.face_workers.process_batch(frames, "enroll")
+        except Exception as e:
+            print(f"Error encoding face burst: {str(e)}")
+            results = []
+        self.after(0, self.finish_face_capture, results)
+    
+    def finish_face_capture(self, results):
+        # Keep the best and most varied encodings of the burst
+        select_enrollment_templates = lazy_imports.load("verification_engine").select_enrollment_templates
+        self.face_embeddings = select_enrollment_templates(results, self.max_face_captures)
+        capture_count = len(self.face_embeddings)
+        elapsed = time.perf_counter() - self.burst_started
+        
+        if capture_count >= self.max_face_captures:
+            self.status_label.config(text=f"Face capture completed successfully ({elapsed:.1f} s)")
             self.face_capture_btn.config(text="Face Captured ✓", state='disabled')
             self.voice_capture_btn.config(state='normal')
         else:
-            self.status_label.config(text=f"Face capture incomplete ({capture_count}/{max_captures})")
+            self.status_label.config(text=f"Face capture incomplete ({capture_count}/{self.max_face_captures})")
             self.face_capture_btn.config(text="Retry Face Capture", state='normal')
-
     
     def start_voice_capture(self):
         self.status_label.config(text="Please prepare to record your voice...")
@@ -294,27 +517,22 @@ class ModernUI(tk.Tk):
     def record_voice(self):
         try:
             # Recording parameters
-            sample_rate = 16000
+            sample_rate = self.verifier.sample_rate
             duration = 5  # seconds
             
             # Record audio
-            self.audio_data = sd.rec(int(sample_rate * duration), 
-                                     samplerate=sample_rate, 
-                                     channels=1, 
-                                     dtype='float32')
-            sd.wait()  # Wait until recording is finished
-            
-            # Extract MFCC features
-            mfcc_features = librosa.feature.mfcc(y=self.audio_data.flatten(), 
-                                               sr=sample_rate,
-                                               n_mfcc=13)
+            with self.audio_source(sample_rate) as source:
+                with metrics.span("audio_record"):
+                    self.audio_data = source.record(duration)
             
-            # Store the average of MFCCs as voice signature
-            self.voice_signature = np.mean(mfcc_features, axis=1)
+            # Store the average of the voiced MFCC frames as voice signature
+            result = self.verifier.enroll_voice(self.audio_data)
+            metrics.observe_timings("voice", result.timings)
+            self.voice_signature = result.template
             
             # Save the audio for verification during login
             temp_voice_file = os.path.join(self.voice_data_dir, f"{self.current_user}_temp.wav")
-            sf.write(temp_voice_file, self.audio_data, sample_rate)
+            lazy_imports.soundfile().write(temp_voice_file, self.audio_data, sample_rate)
             
             self.status_label.config(text="Voice capture completed")
             self.voice_capture_btn.config(text="Voice Captured ✓", state='disabled')
@@ -325,24 +543,24 @@ class ModernUI(tk.Tk):
             self.voice_capture_btn.config(text="Retry Voice Recording", state='normal')
     
     def complete_registration(self):
-        # Save face embeddings
-        if hasattr(self, 'face_embeddings') and self.face_embeddings:
-            face_file = os.path.join(self.face_data_dir, f"{self.current_user}.pkl")
-            with open(face_file, 'wb') as f:
-                pickle.dump(self.face_embeddings, f)
-        else:
+        if not (hasattr(self, 'face_embeddings') and self.face_embeddings):
             messagebox.showerror("Error", "Face data is missing. Please capture your face again.")
             return
         
-        # Save voice signature
-        if hasattr(self, 'voice_signature') and self.voice_signature is not None:
-            voice_file = os.path.join(self.voice_data_dir, f"{self.current_user}.pkl")
-            with open(voice_file, 'wb') as f:
-                pickle.dump({"signature": self.voice_signature, "passphrase": self.passphrase}, f)
-        else:
+        if not (hasattr(self, 'voice_signature') and self.voice_signature is not None):
             messagebox.showerror("Error", "Voice data is missing. Please record your voice again.")
             return
         
+        # Save face embeddings and voice signature
+        self.store.add(self.current_user, self.face_embeddings, self.voice_signature, self.passphrase,
+                       voiced_signature=self.verifier.voiced_signatures)
+        self.templates.invalidate(self.current_user)
+        
+        # Make the new user identifiable without a username
+        self.face_index.add(self.current_user, self.face_embeddings)
+        if self.voice_index is not None:
+            self.voice_index.add(self.current_user, self.voice_signature)
+        
         # Create user directory for files
         user_files_dir = os.path.join(self.files_dir, self.current_user)
         os.makedirs(user_files_dir, exist_ok=True)
@@ -360,10 +578,7 @@ class ModernUI(tk.Tk):
             return
         
         # Check if user exists
-        face_path = os.path.join(self.face_data_dir, f"{username}.pkl")
-        voice_path = os.path.join(self.voice_data_dir, f"{username}.pkl")
-        
-        if not os.path.exists(face_path) or not os.path.exists(voice_path):
+        if username not in self.store:
             messagebox.showerror("Error", "User not registered. Please register first.")
             return
         
@@ -372,6 +587,74 @@ class ModernUI(tk.Tk):
         # Start authentication process
         self.show_auth_screen()
     
+    def start_face_login(self):
+        if len(self.face_index) == 0:
+            messagebox.showerror("Error", "No users registered. Please register first.")
+            return
+        
+        self.show_face_login_screen()
+        
+        if not self.open_camera():
+            return
+        
+        self.is_capturing = True
+        self.identified_user = None
+        
+        # Search every enrolled user for the closest face
+        self.start_face_pipeline("identify", self.face_index.index_dir,
+                                 self.identify_face, self.finish_face_login, max_attempts=20)
+    
+    def show_face_login_screen(self):
+        # Clear existing widgets
+        for widget in self.winfo_children():
+            widget.destroy()
+            
+        main_frame = ttk.Frame(self)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        header_label = ttk.Label(main_frame, text="Face Login", style='Header.TLabel')
+        header_label.pack(pady=10)
+        
+        instructions = ttk.Label(main_frame, text="Look at the camera to identify yourself.", style='SubHeader.TLabel')
+        instructions.pack(pady=10)
+        
+        # Camera frame
+        self.camera_frame = ttk.Frame(main_frame, width=500, height=375)
+        self.camera_frame.pack(pady=20)
+        
+        self.camera_label = ttk.Label(self.camera_frame)
+        self.camera_label.pack()
+        
+        back_btn = ttk.Button(main_frame, text="Back", command=self.show_login_frame)
+        back_btn.pack(pady=10, side=tk.RIGHT)
+        
+        # Status label
+        self.status_label = ttk.Label(main_frame, text="Ready to identify")
+        self.status_label.pack(pady=10)
+    
+    def identify_face(self, result):
+        if result.accepted:
+            self.identified_user = result.username
+            return True
+        return False
+    
+    def finish_face_login(self):
+        if self.identified_user:
+            self.complete_face_login(self.identified_user)
+        else:
+            self.status_label.config(text="Face not recognized. Please try again or log in with your username.")
+    
+    def complete_face_login(self, username):
+        self.current_user = username
+        self.show_auth_screen()
+        
+        # The face has already been matched, only the voice is left
+        self.face_verified = True
+        self.fused_verify_btn.config(state='disabled')
+        self.face_status.config(text="Face verification: Successful ✓", foreground="green")
+        self.face_verify_btn.config(text="Face Verified ✓", state='disabled')
+        self.status_label.config(text=f"Recognized {username}. Please complete voice verification.")
+    
     def show_auth_screen(self):
         # Clear existing widgets
         for widget in self.winfo_children():
@@ -415,6 +698,10 @@ class ModernUI(tk.Tk):
         self.voice_verify_btn = ttk.Button(button_frame, text="Verify Voice", command=self.start_voice_verification)
         self.voice_verify_btn.grid(row=0, column=1, padx=10)
         
+        self.fused_verify_btn = ttk.Button(button_frame, text="Verify Both at Once",
+                                           command=self.start_fused_verification)
+        self.fused_verify_btn.grid(row=0, column=2, padx=10)
+        
         back_btn = ttk.Button(main_frame, text="Back", command=self.show_login_frame)
         back_btn.pack(pady=10, side=tk.RIGHT)
         
@@ -423,124 +710,45 @@ class ModernUI(tk.Tk):
         self.status_label.pack(pady=10)
         
         # Load voice passphrase
-        try:
-            voice_path = os.path.join(self.voice_data_dir, f"{self.current_user}.pkl")
-            with open(voice_path, 'rb') as f:
-                voice_data = pickle.load(f)
-                self.passphrase = voice_data.get("passphrase", "My voice is my password")
-        except:
-            self.passphrase = "My voice is my password"
+        record = self.templates.get(self.current_user)
+        self.passphrase = (record and record.passphrase) or "My voice is my password"
+        
+        self.face_verified = False
+        self.voice_verified = False
     
     def start_face_verification(self):
-        self.status_label.config(text="Initializing camera...")
-        
-        # Try multiple camera indices
-        self.cap = None
+        # Load stored face embeddings before the camera is opened, so a missing record holds nothing open
+        record = self.templates.get(self.current_user)
+        if record is None or len(record.face_encodings) == 0:
+            messagebox.showerror("Error", "Could not load stored face data")
+            self.face_verify_btn.config(text="Retry Face Verification", state='normal')
+            return
+        self.stored_face_embeddings = record.face_encodings
         
-        # Try to open the front camera (usually index 0 or 1)
-        for camera_index in [0, 1, 2]:
-            try:
-                temp_cap = cv2.VideoCapture(camera_index)
-                if temp_cap.isOpened():
-                    # Test if we can actually read a frame
-                    ret, _ = temp_cap.read()
-                    if ret:
-                        self.cap = temp_cap
-                        self.status_label.config(text=f"Camera {camera_index} opened successfully")
-                        break
-                    else:
-                        temp_cap.release()
-            except Exception as e:
-                print(f"Error trying camera {camera_index}: {str(e)}")
-                
-        if self.cap is None:
-            messagebox.showerror("Error", "Could not open any camera. Please check your camera connections and permissions.")
-            self.status_label.config(text="Camera initialization failed")
+        if not self.open_camera():
             return
             
-        # Set camera properties for better quality
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
         self.is_capturing = True
         self.face_verify_btn.config(text="Verifying...", state='disabled')
         
-        # Load stored face embeddings
-        try:
-            face_path = os.path.join(self.face_data_dir, f"{self.current_user}.pkl")
-            with open(face_path, 'rb') as f:
-                self.stored_face_embeddings = pickle.load(f)
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not load stored face data: {str(e)}")
-            self.face_verify_btn.config(text="Retry Face Verification", state='normal')
-            return
+        self.face_verified = False
         
-        # Start camera in a separate thread
-        self.camera_thread = threading.Thread(target=self.verify_face)
-        self.camera_thread.daemon = True
-        self.camera_thread.start()
+        # Compare frames from the face workers with the stored embeddings
+        self.start_face_pipeline("verify", self.stored_face_embeddings,
+                                 self.verify_face, self.finish_face_verification, max_attempts=20)
     
-    def verify_face(self):
-        verified = False
-        verification_attempts = 0
-        max_attempts = 20  # Limit verification attempts
-        
-        while self.is_capturing and verification_attempts < max_attempts:
-            try:
-                ret, frame = self.cap.read()
-                if not ret:
-                    continue
-                    
-                # Flip horizontally for a mirror effect
-                frame = cv2.flip(frame, 1)
-                
-                # Convert to RGB for face_recognition
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                rgb_frame = rgb_frame.astype(np.uint8)
-                
-                # Display the frame
-                img = Image.fromarray(rgb_frame)
-                imgtk = ImageTk.PhotoImage(image=img)
-                self.camera_label.imgtk = imgtk
-                self.camera_label.config(image=imgtk)
-                self.update()
-                
-                # Detect faces
-                face_locations = face_recognition.face_locations(rgb_frame)
-                
-                if face_locations:
-                    # Draw rectangle around face
-                    for (top, right, bottom, left) in face_locations:
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    
-                    # Get face encodings
-                    face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                    
-                    if face_encodings:
-                        # Compare with stored embeddings
-                        matches = face_recognition.compare_faces(self.stored_face_embeddings, face_encodings[0], tolerance=0.5)
-                        
-                        if any(matches):
-                            verified = True
-                            break
-                
-                verification_attempts += 1
-                time.sleep(0.1)  # Small delay to reduce CPU usage
-                
-            except Exception as e:
-                print(f"Error in face verification: {str(e)}")
-                self.status_label.config(text=f"Error: {str(e)}")
-                break
-        
-        # Cleanup
-        if self.cap:
-            self.cap.release()
-        self.is_capturing = False
-        
-        if verified:
+    def verify_face(self, result):
+        if result.accepted:
+            self.face_verified = True
+            return True
+        return False
+    
+    def finish_face_verification(self):
+        if self.face_verified:
             self.face_status.config(text="Face verification: Successful ✓", foreground="green")
             self.face_verify_btn.config(text="Face Verified ✓", state='disabled')
-            self.status_label.config(text="Face verification successful")
+            self.fused_verify_btn.config(state='disabled')
+            self.status_label.config(text=f"Face verification successful ({self.pipeline.elapsed():.1f} s)")
             self.check_authentication_complete()
         else:
             self.face_status.config(text="Face verification: Failed ✗", foreground="red")
@@ -562,39 +770,28 @@ class ModernUI(tk.Tk):
     
     def verify_voice(self):
         try:
-            # Recording parameters
-            sample_rate = 16000
-            duration = 5  # seconds
-            
-            # Record audio
-            audio_data = sd.rec(int(sample_rate * duration), 
-                               samplerate=sample_rate, 
-                               channels=1, 
-                               dtype='float32')
-            sd.wait()  # Wait until recording is finished
-            
-            # Extract MFCC features
-            mfcc_features = librosa.feature.mfcc(y=audio_data.flatten(), 
-                                               sr=sample_rate,
-                                               n_mfcc=13)
-            
-            # Convert to voice signature (average of MFCCs)
-            voice_signature = np.mean(mfcc_features, axis=1)
-            
             # Load stored voice signature
-            voice_path = os.path.join(self.voice_data_dir, f"{self.current_user}.pkl")
-            with open(voice_path, 'rb') as f:
-                voice_data = pickle.load(f)
-                stored_signature = voice_data.get("signature")
+            record = self.templates.get(self.current_user)
+            stored_signature = record.voice_signature if record else None
             
-            # Compare voice signatures using Euclidean distance
+            # Compare voice signatures while recording; stops as soon as the decision is clear
             if stored_signature is not None:
-                distance = np.linalg.norm(voice_signature - stored_signature)
-                threshold = 20.0  # Threshold for voice similarity
+                with self.audio_source(self.verifier.sample_rate) as source:
+                    with metrics.span("voice_verify"):
+                        # Older enrollments averaged every frame, so the probe must too
+                        result = self.voice_stream.verify(source, stored_signature, self.show_voice_progress,
+                                                          voiced_only=record.voiced_signature)
+                metrics.observe_timings("voice", result.timings)
                 
-                if distance < threshold:
+                if result.accepted and not self.voice_stands_out(result.template):
+                    self.voice_status.config(text="Voice verification: Failed ✗", foreground="red")
+                    self.voice_verify_btn.config(text="Retry Voice Verification", state='normal')
+                    self.status_label.config(text="Voice verification failed: the voice is too close to other users")
+                elif result.accepted:
+                    self.voice_verified = True
                     self.voice_status.config(text="Voice verification: Successful ✓", foreground="green")
                     self.voice_verify_btn.config(text="Voice Verified ✓", state='disabled')
+                    self.fused_verify_btn.config(state='disabled')
                     self.status_label.config(text="Voice verification successful")
                     self.check_authentication_complete()
                 else:
@@ -609,12 +806,105 @@ class ModernUI(tk.Tk):
             self.voice_status.config(text="Voice verification: Failed ✗", foreground="red")
             self.voice_verify_btn.config(text="Retry Voice Verification", state='normal')
     
+    def start_fused_verification(self):
+        record = self.templates.get(self.current_user)
+        if record is None or len(record.face_encodings) == 0:
+            messagebox.showerror("Error", "Could not load stored face and voice data")
+            return
+        
+        messagebox.showinfo("Face and Voice Verification",
+                            f"Look at the camera and speak the following passphrase after clicking OK:\n\n\"{self.passphrase}\"")
+        if not self.open_camera():
+            return
+        
+        self.is_capturing = True
+        for button in (self.face_verify_btn, self.voice_verify_btn, self.fused_verify_btn):
+            button.config(state='disabled')
+        self.status_label.config(text="Verifying... Please look at the camera and speak now.")
+        
+        # Camera frames go to the face workers while the voice is recorded on its own thread
+        self.start_face_workers()
+        CapturePipeline = lazy_imports.load("capture_pipeline").CapturePipeline
+        score_fusion = lazy_imports.load("score_fusion")
+        self.pipeline = CapturePipeline(None, self.face_workers, "verify", record.face_encodings,
+                                        grabber=self.grabber)
+        fusion = score_fusion.ScoreFusion(face_threshold=self.verifier.face_tolerance,
+                                          voice_threshold=self.verifier.voice_threshold,
+                                          voice_veto=self.voice_stream.reject_threshold)
+        self.fused = score_fusion.FusedVerification(fusion, self.pipeline, self.voice_stream,
+                                                    self.audio_source(self.verifier.sample_rate),
+                                                    record.voice_signature,
+                                                    voiced_signature=record.voiced_signature)
+        self.fused.start()
+        self.after(30, self.poll_fused_verification)
+    
+    def poll_fused_verification(self):
+        try:
+            if self.is_capturing:
+                for item in self.fused.poll():
+                    self.show_detection(item.result)
+                if self.fused.decision is not None:
+                    self.is_capturing = False
+                else:
+                    self.status_label.config(text=f"Verifying... {self.fused.heard:.1f}s heard, "
+                                                  f"confidence {self.fused.confidence():.0%}")
+        except Exception as e:
+            print(f"Error in face and voice verification: {str(e)}")
+            self.is_capturing = False
+        
+        if self.is_capturing:
+            self.after(30, self.poll_fused_verification)
+            return
+        
+        # Cleanup
+        self.fused.stop()
+        self.close_camera()
+        metrics.observe("fused_verify", self.fused.elapsed())
+        
+        try:
+            self.finish_fused_verification()
+        except tk.TclError:
+            pass  # The screen was left while verifying
+    
+    def finish_fused_verification(self):
+        stats = self.fused.stats()
+        voice_result = self.fused.voice_result
+        if stats["decision"] and not self.voice_stands_out(voice_result and voice_result.template):
+            stats["decision"] = False
+        if stats["decision"]:
+            self.face_verified = self.voice_verified = True
+            self.face_status.config(text="Face verification: Successful ✓", foreground="green")
+            self.voice_status.config(text="Voice verification: Successful ✓", foreground="green")
+            self.face_verify_btn.config(text="Face Verified ✓")
+            self.voice_verify_btn.config(text="Voice Verified ✓")
+            self.status_label.config(text=f"Face and voice verified in {stats['elapsed']:.1f} s "
+                                          f"(confidence {stats['confidence']:.0%})")
+            self.check_authentication_complete()
+        else:
+            self.face_status.config(text="Face verification: Failed ✗", foreground="red")
+            self.voice_status.config(text="Voice verification: Failed ✗", foreground="red")
+            for button in (self.face_verify_btn, self.voice_verify_btn, self.fused_verify_btn):
+                button.config(state='normal')
+            if stats["voice_error"] is not None:
+                self.status_label.config(text=f"Face and voice verification failed: "
+                                              f"error recording voice: {str(stats['voice_error'])}")
+            else:
+                self.status_label.config(text="Face and voice verification failed")
+    
+    def voice_stands_out(self, signature):
+        # Without --voice-cohort-z only the distance to the claimed user counts
+        if self.voice_index is None or signature is None:
+            return True
+        with metrics.span("voice_cohort"):
+            _, z = self.voice_index.cohort_score(signature, self.current_user)
+        return z is None or z >= self.voice_cohort_z
+    
+    def show_voice_progress(self, heard, voiced, distance):
+        self.status_label.config(text=f"Listening... {heard:.1f}s ({voiced:.1f}s of speech)")
+    
     def check_authentication_complete(self):
         # Check if both face and voice are verified
-        face_verified = self.face_status.cget("text").endswith("✓")
-        voice_verified = self.voice_status.cget("text").endswith("✓")
-        
-        if face_verified and voice_verified:
+        if self.face_verified and self.voice_verified:
             self.status_label.config(text="Authentication successful! Loading file manager...")
             
             # Add a short delay before showing the file manager
@@ -636,7 +926,7 @@ class ModernUI(tk.Tk):
         welcome_label = ttk.Label(header_frame, text=f"Welcome, {self.current_user}!", style='Header.TLabel')
         welcome_label.pack(side=tk.LEFT)
         
-        logout_btn = ttk.Button(header_frame, text="Logout", command=self.show_login_frame)
+        logout_btn = ttk.Button(header_frame, text="Logout", command=self.logout)
         logout_btn.pack(side=tk.RIGHT)
         
         # File management section
@@ -691,67 +981,74 @@ class ModernUI(tk.Tk):
         refresh_btn = ttk.Button(action_frame, text="Refresh List", command=self.refresh_file_list)
         refresh_btn.pack(fill=tk.X, pady=5)
         
+        cancel_btn = ttk.Button(action_frame, text="Cancel Transfers", command=self.cancel_transfers)
+        cancel_btn.pack(fill=tk.X, pady=5)
+        
         # Status bar
         self.status_bar = ttk.Label(main_frame, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Load file list
+        # Load file list; transfers that ended while it was closed are already reflected in it
+        self.transfers.finished_transfers()
         self.refresh_file_list()
+        if self.transfers.active():
+            self.poll_transfers()
+    
+    def logout(self):
+        # Nothing keeps moving files for a user who has logged out
+        self.transfers.cancel_all()
+        self.show_login_frame()
     
+    @metrics.timed("file_list")
     def refresh_file_list(self):
         # Clear current list
         for item in self.file_tree.get_children():
             self.file_tree.delete(item)
-        
-        user_files_dir = os.path.join(self.files_dir, self.current_user)
-        
-        if not os.path.exists(user_files_dir):
-            os.makedirs(user_files_dir, exist_ok=True)
+        # Row of each filename, so a finished transfer can update just its own
+        self.file_rows = {}
         
         try:
-            for filename in os.listdir(user_files_dir):
-                file_path = os.path.join(user_files_dir, filename)
-                if os.path.isfile(file_path):
-                    file_size = os.path.getsize(file_path)
-                    file_time = os.path.getmtime(file_path)
-                    date_modified = datetime.fromtimestamp(file_time).strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    if file_size < 1024:
-                        size_str = f"{file_size} B"
-                    elif file_size < 1024 * 1024:
-                        size_str = f"{file_size/1024:.1f} KB"
-                    else:
-                        size_str = f"{file_size/(1024*1024):.1f} MB"
-                    
-                    self.file_tree.insert('', tk.END, values=(filename, size_str, date_modified))
+            for filename, file_size, file_time in self.file_store.list_files(self.current_user):
+                self.file_rows[filename] = self.file_tree.insert('', tk.END,
+                                                                 values=self.file_row_values(filename, file_size,
+                                                                                             file_time))
             self.status_bar.config(text=f"Found {len(self.file_tree.get_children())} files")
         except Exception as e:
             self.status_bar.config(text=f"Error listing files: {str(e)}")
     
+    def file_row_values(self, filename, size, mtime):
+        return (filename, format_size(size), datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S'))
+    
+    def update_file_row(self, filename):
+        values = self.file_row_values(filename, *self.file_store.stat(self.current_user, filename))
+        item = self.file_rows.get(filename)
+        if item is not None and self.file_tree.exists(item):
+            self.file_tree.item(item, values=values)
+        else:
+            self.file_rows[filename] = self.file_tree.insert('', tk.END, values=values)
+    
     def upload_file(self):
         filetypes = [("All Files", "*.*"), 
                     ("Text Files", "*.txt"), 
                     ("Images", "*.jpg *.jpeg *.png *.gif"), 
                     ("Documents", "*.pdf *.doc *.docx")]
-        filepath = filedialog.askopenfilename(title="Select File to Upload", filetypes=filetypes)
-        if not filepath:
+        filepaths = filedialog.askopenfilenames(title="Select Files to Upload", filetypes=filetypes)
+        if not filepaths:
             return
         
-        user_files_dir = os.path.join(self.files_dir, self.current_user)
-        destination = os.path.join(user_files_dir, os.path.basename(filepath))
-        
-        try:
-            if os.path.exists(destination):
-                overwrite = messagebox.askyesno("File Exists", 
-                                               f"File {os.path.basename(filepath)} already exists.\nDo you want to overwrite it?")
-                if not overwrite:
-                    return
-            shutil.copy2(filepath, destination)
-            self.status_bar.config(text=f"Uploaded: {os.path.basename(filepath)}")
-            self.refresh_file_list()
-        except Exception as e:
-            messagebox.showerror("Upload Error", f"Failed to upload file: {str(e)}")
-            self.status_bar.config(text=f"Upload failed: {str(e)}")
+        for filepath in filepaths:
+            filename = os.path.basename(filepath)
+            try:
+                if self.file_store.exists(self.current_user, filename):
+                    overwrite = messagebox.askyesno("File Exists", 
+                                                   f"File {filename} already exists.\nDo you want to overwrite it?")
+                    if not overwrite:
+                        continue
+                self.transfers.upload(self.current_user, filepath, filename)
+            except Exception as e:
+                messagebox.showerror("Upload Error", f"Failed to upload file: {str(e)}")
+                self.status_bar.config(text=f"Upload failed: {str(e)}")
+        self.poll_transfers()
     
     def download_file(self):
         selection = self.file_tree.selection()
@@ -759,27 +1056,84 @@ class ModernUI(tk.Tk):
             messagebox.showwarning("No Selection", "Please select a file to download")
             return
         
-        file_info = self.file_tree.item(selection[0], 'values')
-        filename = file_info[0]
-        
-        source_path = os.path.join(self.files_dir, self.current_user, filename)
+        filenames = [self.file_tree.item(item, 'values')[0] for item in selection]
+        
+        for filename in filenames:
+            if not self.file_store.exists(self.current_user, filename):
+                messagebox.showerror("File Not Found", f"File {filename} not found")
+                return
+        
+        # One file is saved under a chosen name, several into a chosen folder
+        if len(filenames) == 1:
+            filetypes = [("All Files", "*.*")]
+            save_path = filedialog.asksaveasfilename(title="Save File As", defaultextension="*.*",
+                                                    initialfile=filenames[0], filetypes=filetypes)
+            if not save_path:
+                return
+            destinations = [save_path]
+        else:
+            save_dir = filedialog.askdirectory(title="Save Files To")
+            if not save_dir:
+                return
+            destinations = [os.path.join(save_dir, filename) for filename in filenames]
         
-        if not os.path.exists(source_path):
-            messagebox.showerror("File Not Found", f"File {filename} not found")
+        for filename, destination in zip(filenames, destinations):
+            try:
+                self.transfers.download(self.current_user, filename, destination)
+            except Exception as e:
+                messagebox.showerror("Download Error", f"Failed to download file: {str(e)}")
+                self.status_bar.config(text=f"Download failed: {str(e)}")
+        self.poll_transfers()
+    
+    def poll_transfers(self):
+        # Progress of the running transfers, a few times a second until none are left
+        if self.transfer_polling:
+            return
+        self.transfer_polling = True
+        self.show_transfer_progress()
+    
+    def show_transfer_progress(self):
+        # Taken after active(), so a transfer missing from it has already been queued as finished
+        active = self.transfers.active()
+        for transfer in self.transfers.finished_transfers():
+            self.finish_transfer(transfer)
+        if not active or not self.status_bar.winfo_exists():
+            self.transfer_polling = False
             return
         
-        filetypes = [("All Files", "*.*")]
-        save_path = filedialog.asksaveasfilename(title="Save File As", defaultextension="*.*",
-                                                initialfile=filename, filetypes=filetypes)
-        if not save_path:
+        running = [transfer for transfer in active if transfer.state == "running"]
+        queued = len(active) - len(running)
+        parts = [f"{'Uploading' if transfer.kind == 'upload' else 'Downloading'} {transfer.filename}: "
+                 f"{transfer.fraction():.0%} of {format_size(transfer.total)} at "
+                 f"{format_size(transfer.throughput())}/s" for transfer in running]
+        if queued:
+            parts.append(f"{queued} queued")
+        self.status_bar.config(text="; ".join(parts) or "Starting transfers...")
+        self.after(250, self.show_transfer_progress)
+    
+    def cancel_transfers(self):
+        active = self.transfers.active()
+        self.transfers.cancel_all()
+        self.status_bar.config(text=f"Cancelling {len(active)} transfers" if active else "No transfers to cancel")
+    
+    def finish_transfer(self, transfer):
+        # The file manager may have been closed, or another user logged in, meanwhile
+        if transfer.username != self.current_user or not self.file_tree.winfo_exists():
             return
         
-        try:
-            shutil.copy2(source_path, save_path)
-            self.status_bar.config(text=f"Downloaded: {filename}")
-        except Exception as e:
-            messagebox.showerror("Download Error", f"Failed to download file: {str(e)}")
-            self.status_bar.config(text=f"Download failed: {str(e)}")
+        verb = "Uploaded" if transfer.kind == "upload" else "Downloaded"
+        if transfer.state == "done":
+            if transfer.kind == "upload":
+                self.update_file_row(transfer.filename)
+            self.status_bar.config(text=f"{verb}: {transfer.filename} ({format_size(transfer.total)} in "
+                                        f"{transfer.elapsed():.1f} s, {format_size(transfer.throughput())}/s)")
+        elif transfer.state == "cancelled":
+            self.status_bar.config(text=f"Cancelled: {transfer.filename}")
+        else:
+            title = "Upload Error" if transfer.kind == "upload" else "Download Error"
+            action = "upload" if transfer.kind == "upload" else "download"
+            messagebox.showerror(title, f"Failed to {action} file: {str(transfer.error)}")
+            self.status_bar.config(text=f"{action.capitalize()} failed: {str(transfer.error)}")
     
     def delete_file(self):
         selection = self.file_tree.selection()
@@ -787,24 +1141,75 @@ class ModernUI(tk.Tk):
             messagebox.showwarning("No Selection", "Please select a file to delete")
             return
         
-        file_info = self.file_tree.item(selection[0], 'values')
-        filename = file_info[0]
+        item = selection[0]
+        filename = self.file_tree.item(item, 'values')[0]
         
         confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {filename}?")
         if not confirm:
             return
         
-        file_path = os.path.join(self.files_dir, self.current_user, filename)
-        
         try:
-            os.remove(file_path)
+            with metrics.span("file_delete"):
+                self.file_store.delete(self.current_user, filename)
             self.status_bar.config(text=f"Deleted: {filename}")
-            self.refresh_file_list()
+            self.file_tree.delete(item)
+            self.file_rows.pop(filename, None)
+            # Reclaim the chunks no other file shares, off the UI thread
+            if isinstance(self.file_store, ChunkedFileStore):
+                threading.Thread(target=self.file_store.collect_garbage, daemon=True).start()
         except Exception as e:
             messagebox.showerror("Delete Error", f"Failed to delete file: {str(e)}")
             self.status_bar.config(text=f"Delete failed: {str(e)}")
 
 if __name__ == "__main__":
-    app = ModernUI()
+    parser = argparse.ArgumentParser(description="Face and voice authentication system")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print per-phase and per-import startup timings")
+    parser.add_argument("--no-warm-up", action="store_true",
+                        help="do not preload heavy libraries in the background")
+    parser.add_argument("--metrics-file", default=None,
+                        help="record span timings and write them here (.json for a JSON snapshot, "
+                             "otherwise Prometheus text format)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between metrics file updates")
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument("--replay-video", help="use a video file instead of the camera")
+    replay.add_argument("--replay-images", help="use a directory of images instead of the camera")
+    parser.add_argument("--replay-audio", help="use a WAV file instead of the microphone")
+    parser.add_argument("--camera-idle-timeout", type=float, default=60.0,
+                        help="seconds an unused camera stays open between captures")
+    parser.add_argument("--preview-fps", type=float, default=15,
+                        help="maximum camera preview frame rate")
+    parser.add_argument("--voice-cohort-z", type=float, default=None,
+                        help="also reject a voice unless its similarity to the claimed user is this many "
+                             "standard deviations above the most similar other users (e.g. 2.0)")
+    parser.add_argument("--chunked-files", action="store_true",
+                        help="store user files as deduplicated content-defined chunks "
+                             "(import existing files with: python file_store.py migrate)")
+    args = parser.parse_args()
+    
+    if args.metrics_file:
+        metrics.enabled = True
+    
+    # Replays loop and run in real time, like the devices they stand in for
+    def frame_source():
+        media_sources = lazy_imports.load("media_sources")
+        if args.replay_video:
+            return media_sources.VideoFileSource(args.replay_video, realtime=True, loop=True)
+        if args.replay_images:
+            return media_sources.ImageSequenceSource(args.replay_images, realtime=True, loop=True)
+        return default_frame_source()
+    
+    def audio_source(sample_rate):
+        media_sources = lazy_imports.load("media_sources")
+        if args.replay_audio:
+            return media_sources.WavFileSource(args.replay_audio, sample_rate, realtime=True)
+        return media_sources.MicrophoneSource(sample_rate)
+    
+    app = ModernUI(warm_up=not args.no_warm_up, profile_startup=args.profile_startup,
+                   metrics_file=args.metrics_file, metrics_interval=args.metrics_interval,
+                   frame_source=frame_source, audio_source=audio_source,
+                   camera_idle_timeout=args.camera_idle_timeout, preview_fps=args.preview_fps,
+                   voice_cohort_z=args.voice_cohort_z, chunked_files=args.chunked_files)
     app.mainloop()
 
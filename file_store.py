@@ -0,0 +1,502 @@
+import argparse
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+# Chunk sizes: a boundary is found every 2**CHUNK_AVG_BITS bytes past the minimum, on average (at most 16 bits)
+CHUNK_MIN = 16 * 1024
+CHUNK_AVG_BITS = 16
+CHUNK_MAX = 256 * 1024
+WINDOW = 48
+SEGMENT = 4 * 1024 * 1024
+COPY_CHUNK = 8 * 1024 * 1024
+
+# Errors meaning a kernel-side copy is not supported between these files, rather than a failed copy
+_NO_KERNEL_COPY = {getattr(errno, name) for name in ("EXDEV", "ENOSYS", "EINVAL", "EOPNOTSUPP", "ENOTSUP",
+                                                     "ENOTSOCK", "EBADF") if hasattr(errno, name)}
+
+# Per-byte values of the rolling hash, derived from SHA-256 so boundaries never change between installs
+_GEAR = np.frombuffer(b"".join(hashlib.sha256(bytes([i])).digest()[:2] for i in range(256)), dtype="<u2")
+# The values of every pair of bytes, so a single lookup of a little-endian 16-bit word yields two of them
+_PAIRS = np.arange(65536)
+_GEAR_PAIRS = _GEAR[_PAIRS & 0xFF].astype("<u4") | (_GEAR[_PAIRS >> 8].astype("<u4") << 16)
+del _PAIRS
+
+# Bytes scanned per pass, small enough for the intermediate arrays to stay in the CPU cache
+SCAN_BLOCK = 256 * 1024
+
+
+def _window_sums(values):
+    """Sum of every WINDOW consecutive values, from partial sums doubling in width.
+
+    A handful of vectorised additions, which is cheaper than a running sum
+    followed by a subtraction.
+    """
+    total = None
+    covered = 0
+    partial, width = values, 1
+    while True:
+        if WINDOW & width:
+            total = partial if total is None else total[:len(partial) - covered] + partial[covered:]
+            covered += width
+        width *= 2
+        if width > WINDOW:
+            return total
+        partial = partial[:-(width // 2)] + partial[width // 2:]
+
+
+def _window_ends(data, avg_bits):
+    """End offsets of every WINDOW bytes of ``data`` whose hash sum has its low ``avg_bits`` bits zero."""
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = []
+    for offset in range(0, len(data) - WINDOW + 1, SCAN_BLOCK):
+        block = data[offset:offset + SCAN_BLOCK + WINDOW - 1]
+        even = len(block) & ~1
+        values = _GEAR_PAIRS[block[:even].view("<u2")].view("<u2")
+        if even < len(block):
+            values = np.append(values, _GEAR[block[-1]])
+        # Only the low bits count, so 16-bit sums wrapping around give the same windows at half the memory traffic
+        sums = _window_sums(values)
+        if avg_bits < 16:
+            sums &= np.uint16((1 << avg_bits) - 1)
+        ends.append(np.flatnonzero(sums == 0) + offset + WINDOW)
+    return np.concatenate(ends) if ends else np.empty(0, dtype=np.intp)
+
+
+def chunk_boundaries(data, final=True, min_size=CHUNK_MIN, avg_bits=CHUNK_AVG_BITS, max_size=CHUNK_MAX):
+    """End offsets of the content-defined chunks at the start of ``data``.
+
+    A chunk ends after a byte where the sum of the per-byte hash values of
+    the last WINDOW bytes has its low ``avg_bits`` bits all zero, so
+    boundaries depend only on nearby content and an insertion shifts only
+    the chunks around it. Chunks are never shorter than ``min_size`` or
+    longer than ``max_size``. Unless ``final``, the bytes after the last
+    boundary are left for the next call, prefixed to more data.
+    """
+    n = len(data)
+    cuts = []
+    start = 0
+
+    if n > min_size:
+        for end in _window_ends(data, avg_bits).tolist():
+            while end - start > max_size:
+                start += max_size
+                cuts.append(start)
+            if end - start >= min_size:
+                cuts.append(end)
+                start = end
+
+    while n - start > max_size:
+        start += max_size
+        cuts.append(start)
+    if final and start < n:
+        cuts.append(n)
+    return cuts
+
+
+def iter_chunks(f, segment_size=SEGMENT):
+    """Yield the content-defined chunks of a binary file, reading a segment at a time."""
+    pending = b""
+    while True:
+        data = f.read(segment_size)
+        buffer = memoryview(pending + data)
+        start = 0
+        for end in chunk_boundaries(buffer, final=not data):
+            yield buffer[start:end]
+            start = end
+        pending = bytes(buffer[start:])
+        if not data:
+            return
+
+
+class TransferCancelled(Exception):
+    """Raised by an upload or download whose should_stop() returned True."""
+
+
+def _kernel_copiers(src, dst):
+    """Copy functions (offset, count) -> bytes copied, fastest first."""
+    copiers = []
+    if hasattr(os, "copy_file_range"):
+        copiers.append(lambda offset, count: os.copy_file_range(src.fileno(), dst.fileno(), count, offset, offset))
+    if hasattr(os, "sendfile"):
+        def send(offset, count):
+            os.lseek(dst.fileno(), offset, os.SEEK_SET)
+            return os.sendfile(dst.fileno(), src.fileno(), offset, count)
+        copiers.append(send)
+    return copiers
+
+
+def copy_file(source_path, destination, on_progress=None, should_stop=None, chunk_size=COPY_CHUNK):
+    """Copy a file a chunk at a time, keeping its timestamps like shutil.copy2.
+
+    The data is copied inside the kernel with os.copy_file_range() or
+    os.sendfile() where the platform and file systems allow it, otherwise
+    through one reused buffer. ``on_progress(bytes_copied)`` is called
+    after every chunk, and TransferCancelled is raised once
+    ``should_stop()`` returns True. The copy is written under a temporary
+    name, so ``destination`` is only replaced by a complete file, and an
+    IOError is raised when the bytes copied do not add up to the size of
+    the source.
+    """
+    tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        with open(source_path, "rb", buffering=0) as src, open(tmp_path, "wb", buffering=0) as dst:
+            buffer = memoryview(bytearray(chunk_size))
+
+            def read_write(offset, count):
+                src.seek(offset)
+                read = src.readinto(buffer[:count])
+                if not read:
+                    return 0
+                dst.seek(offset)
+                return dst.write(buffer[:read])
+
+            copiers = _kernel_copiers(src, dst) + [read_write]
+            size = os.fstat(src.fileno()).st_size
+            copied = 0
+            while True:
+                if should_stop is not None and should_stop():
+                    raise TransferCancelled(f"copy of {source_path} cancelled")
+                try:
+                    count = copiers[0](copied, chunk_size)
+                except OSError as e:
+                    if len(copiers) == 1 or e.errno not in _NO_KERNEL_COPY:
+                        raise
+                    copiers.pop(0)
+                    continue
+                if count == 0:
+                    # Some file systems (procfs, sysfs, FUSE) copy nothing in the kernel without an error
+                    if copied == 0 and len(copiers) > 1:
+                        copiers.pop(0)
+                        continue
+                    break
+                copied += count
+                if on_progress is not None:
+                    on_progress(copied)
+            if copied != size:
+                raise IOError(f"copied {copied} of {size} bytes of {source_path}")
+        shutil.copystat(source_path, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# Name of a write in progress, kept next to its destination: <name>.<pid>.<thread id>.<tmp or part>
+_TEMP_NAME = re.compile(r"\.\d+\.\d+\.(tmp|part)$")
+
+
+def _is_temp_name(name, suffixes=("tmp", "part")):
+    match = _TEMP_NAME.search(name)
+    return match is not None and match.group(1) in suffixes
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class DirectoryFileStore:
+    """Each user's files kept as plain copies in ``<root>/<username>/``."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, username, filename):
+        return os.path.join(self.root, username, filename)
+
+    def list_files(self, username):
+        """(filename, size, mtime) of every file a user has stored."""
+        user_dir = os.path.join(self.root, username)
+        os.makedirs(user_dir, exist_ok=True)
+        # Copies still in progress are written as <name>.<pid>.<thread id>.part;
+        # any other name, including a user's own *.part file, is listed
+        with os.scandir(user_dir) as entries:
+            return [(entry.name, entry.stat().st_size, entry.stat().st_mtime)
+                    for entry in entries if entry.is_file() and not _is_temp_name(entry.name, ("part",))]
+
+    def exists(self, username, filename):
+        return os.path.isfile(self.path(username, filename))
+
+    def stat(self, username, filename):
+        """(size, mtime) of a stored file."""
+        st = os.stat(self.path(username, filename))
+        return st.st_size, st.st_mtime
+
+    def upload(self, username, source_path, filename=None, on_progress=None, should_stop=None):
+        destination = self.path(username, filename or os.path.basename(source_path))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        copy_file(source_path, destination, on_progress, should_stop)
+
+    def download(self, username, filename, destination, on_progress=None, should_stop=None):
+        copy_file(self.path(username, filename), destination, on_progress, should_stop)
+
+    def delete(self, username, filename):
+        os.remove(self.path(username, filename))
+
+
+class ChunkedFileStore:
+    """User files split into content-defined chunks, each unique chunk stored once.
+
+    Layout under ``root``:
+
+        chunks/<first two hex digits>/<sha256>   chunk contents
+        manifests/<username>/<filename>          JSON size, mtime and chunk list
+
+    Uploading a file that is already stored, by any user, only writes a
+    manifest. Chunks are written before the manifest that refers to them,
+    so a crash can leave unreferenced chunks but never a manifest with
+    missing chunks; collect_garbage() removes the former. Reference counts
+    are derived from the manifests on first use and kept in memory.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.manifests_dir = os.path.join(root, "manifests")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        self._refs = None
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _manifest_path(self, username, filename):
+        return os.path.join(self.manifests_dir, username, filename)
+
+    def _read_manifest(self, username, filename):
+        with open(self._manifest_path(username, filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load_refs(self):
+        """Count the references to every chunk; call with the lock held."""
+        if self._refs is None:
+            refs = {}
+            for username in os.listdir(self.manifests_dir):
+                for filename in os.listdir(os.path.join(self.manifests_dir, username)):
+                    if _is_temp_name(filename):
+                        continue
+                    for digest, size in self._read_manifest(username, filename)["chunks"]:
+                        refs[digest] = refs.get(digest, 0) + 1
+                        self._sizes[digest] = size
+            self._refs = refs
+        return self._refs
+
+    def _release(self, chunks):
+        """Drop one reference to each chunk; call with the lock held and the counts loaded.
+
+        Counts that are already zero or missing are left alone, so a chunk
+        is never released on behalf of a manifest that was not counted.
+        """
+        for digest, _ in chunks:
+            if self._refs.get(digest, 0) > 0:
+                self._refs[digest] -= 1
+
+    def list_files(self, username):
+        """(filename, size, mtime) of every file a user has stored."""
+        user_dir = os.path.join(self.manifests_dir, username)
+        if not os.path.isdir(user_dir):
+            return []
+        files = []
+        for filename in os.listdir(user_dir):
+            # Manifests being written sit next to the real ones under a temporary name
+            if _is_temp_name(filename):
+                continue
+            manifest = self._read_manifest(username, filename)
+            files.append((filename, manifest["size"], manifest["mtime"]))
+        return files
+
+    def exists(self, username, filename):
+        return os.path.isfile(self._manifest_path(username, filename))
+
+    def stat(self, username, filename):
+        """(size, mtime) of a stored file."""
+        manifest = self._read_manifest(username, filename)
+        return manifest["size"], manifest["mtime"]
+
+    def upload(self, username, source_path, filename=None, on_progress=None, should_stop=None):
+        """Store a file, writing only the chunks not stored yet.
+
+        ``on_progress`` and ``should_stop`` work as for copy_file(). Returns
+        (bytes read, bytes written to new chunks).
+        """
+        filename = filename or os.path.basename(source_path)
+        chunks = []
+        size = written = 0
+        try:
+            with open(source_path, "rb") as f:
+                for chunk in iter_chunks(f):
+                    if should_stop is not None and should_stop():
+                        raise TransferCancelled(f"upload of {source_path} cancelled")
+                    digest = hashlib.sha256(chunk).hexdigest()
+                    path = self._chunk_path(digest)
+                    # Referencing the chunk first keeps collect_garbage() away from it
+                    with self._lock:
+                        refs = self._load_refs()
+                        refs[digest] = refs.get(digest, 0) + 1
+                        self._sizes[digest] = len(chunk)
+                        chunks.append((digest, len(chunk)))
+                        stored = os.path.exists(path)
+                    if not stored:
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        _write_atomic(path, chunk)
+                        written += len(chunk)
+                    size += len(chunk)
+                    if on_progress is not None:
+                        on_progress(size)
+
+            manifest_path = self._manifest_path(username, filename)
+            manifest = {"size": size, "mtime": os.path.getmtime(source_path), "chunks": chunks}
+            # The counts must be loaded before the old manifest is replaced, or they would miss it
+            with self._lock:
+                self._load_refs()
+                previous = []
+                if os.path.exists(manifest_path):
+                    previous = self._read_manifest(username, filename)["chunks"]
+                os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+                _write_atomic(manifest_path, json.dumps(manifest).encode("utf-8"))
+                self._release(previous)
+        except BaseException:
+            with self._lock:
+                self._load_refs()
+                self._release(chunks)
+            raise
+        return size, written
+
+    def open_chunks(self, username, filename):
+        """Yield a stored file's contents a chunk at a time, checking each chunk's hash."""
+        for digest, _ in self._read_manifest(username, filename)["chunks"]:
+            with open(self._chunk_path(digest), "rb") as f:
+                chunk = f.read()
+            if hashlib.sha256(chunk).hexdigest() != digest:
+                raise IOError(f"chunk {digest} of {filename} is corrupted")
+            yield chunk
+
+    def download(self, username, filename, destination, on_progress=None, should_stop=None):
+        """Reassemble a stored file at ``destination`` by streaming its chunks.
+
+        ``on_progress`` and ``should_stop`` work as for copy_file().
+        """
+        manifest = self._read_manifest(username, filename)
+        tmp_path = f"{destination}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                written = 0
+                for chunk in self.open_chunks(username, filename):
+                    if should_stop is not None and should_stop():
+                        raise TransferCancelled(f"download of {filename} cancelled")
+                    f.write(chunk)
+                    written += len(chunk)
+                    if on_progress is not None:
+                        on_progress(written)
+            os.utime(tmp_path, (time.time(), manifest["mtime"]))
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, username, filename):
+        """Remove a file's manifest; its chunks are reclaimed by collect_garbage()."""
+        with self._lock:
+            # Loaded before the manifest goes, so the counts still include this file's chunks
+            self._load_refs()
+            chunks = self._read_manifest(username, filename)["chunks"]
+            os.remove(self._manifest_path(username, filename))
+            self._release(chunks)
+
+    def collect_garbage(self, tmp_age=3600.0):
+        """Delete every chunk no manifest refers to; returns (chunks, bytes) reclaimed.
+
+        Temporary chunk and manifest files of writes interrupted more than
+        ``tmp_age`` seconds ago are removed too.
+        """
+        for username in os.listdir(self.manifests_dir):
+            user_dir = os.path.join(self.manifests_dir, username)
+            for filename in os.listdir(user_dir):
+                path = os.path.join(user_dir, filename)
+                if _is_temp_name(filename) and time.time() - os.path.getmtime(path) > tmp_age:
+                    os.remove(path)
+
+        removed = reclaimed = 0
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, name)
+                if name.endswith(".tmp"):
+                    if time.time() - os.path.getmtime(path) > tmp_age:
+                        os.remove(path)
+                    continue
+                with self._lock:
+                    refs = self._load_refs()
+                    if refs.get(name, 0) > 0:
+                        continue
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    refs.pop(name, None)
+                    self._sizes.pop(name, None)
+                removed += 1
+                reclaimed += size
+        return removed, reclaimed
+
+    def stats(self):
+        """Logical bytes in all manifests against bytes of referenced unique chunks."""
+        with self._lock:
+            refs = self._load_refs()
+            live = [digest for digest, count in refs.items() if count > 0]
+            logical = sum(self._sizes[digest] * refs[digest] for digest in live)
+            stored = sum(self._sizes[digest] for digest in live)
+        return {"chunks": len(live), "logical_bytes": logical, "stored_bytes": stored,
+                "dedup_ratio": logical / stored if stored else None}
+
+
+def migrate_directory(source, store):
+    """Upload every ``<source>/<username>/<file>`` into ``store``; returns the file count."""
+    count = 0
+    for username in sorted(os.listdir(source)):
+        user_dir = os.path.join(source, username)
+        if not os.path.isdir(user_dir):
+            continue
+        for filename in sorted(os.listdir(user_dir)):
+            path = os.path.join(user_dir, filename)
+            if os.path.isfile(path) and not store.exists(username, filename):
+                store.upload(username, path, filename)
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the deduplicated user file store")
+    parser.add_argument("command", choices=("stats", "gc", "migrate"))
+    parser.add_argument("--root", default=os.path.join("auth_system_data", "chunk_store"))
+    parser.add_argument("--source", default=os.path.join("auth_system_data", "user_files"),
+                        help="directory of plain user files to import (migrate)")
+    args = parser.parse_args()
+
+    store = ChunkedFileStore(args.root)
+    if args.command == "migrate":
+        print(f"Imported {migrate_directory(args.source, store)} files from {args.source}")
+    elif args.command == "gc":
+        removed, reclaimed = store.collect_garbage()
+        print(f"Removed {removed} unreferenced chunks ({reclaimed / (1024 * 1024):.1f} MB)")
+
+    stats = store.stats()
+    ratio = f"{stats['dedup_ratio']:.2f}x" if stats["dedup_ratio"] else "n/a"
+    print(f"{stats['chunks']} chunks, {stats['logical_bytes'] / (1024 * 1024):.1f} MB of files stored in "
+          f"{stats['stored_bytes'] / (1024 * 1024):.1f} MB (deduplication {ratio})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+
+
+# User-facing hints for each FrameQualityGate rejection reason
+REJECTION_HINTS = {
+    "blurry": "Please hold still",
+    "dark": "Too dark, please improve the lighting",
+    "bright": "Too bright, please avoid direct light",
+    "low_contrast": "Low contrast, please improve the lighting",
+    "small_face": "Please move closer to the camera",
+}
+
+
+def sharpness(gray):
+    """Variance of the Laplacian; low values mean a blurry image."""
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def quality_score(rgb_frame, face_location):
+    """Relative quality of a detected face for enrollment.
+
+    Combines sharpness, exposure and size of the face crop. Only meaningful
+    for ranking frames of the same person against each other.
+    """
+    top, right, bottom, left = face_location
+    face = cv2.cvtColor(np.ascontiguousarray(rgb_frame[top:bottom, left:right]), cv2.COLOR_RGB2GRAY)
+    if face.size == 0:
+        return 0.0
+
+    exposure = 1.0 - abs(float(face.mean()) - 128.0) / 128.0
+    size = min(1.0, (bottom - top) / 150.0)
+    return float(np.log1p(sharpness(face)) * exposure * size)
+
+
+class FrameQualityGate:
+    """Cheap pre-checks that keep bad frames away from the face encoder.
+
+    check_frame() runs before detection on a small grayscale copy and
+    rejects blurry, dark, overexposed and flat frames; check_face() runs
+    after detection and rejects faces too small to encode reliably. Each
+    rejection is counted per reason in ``counters``.
+    """
+
+    REASONS = ("blurry", "dark", "bright", "low_contrast", "small_face")
+
+    def __init__(self, min_sharpness=25.0, min_brightness=40.0, max_brightness=220.0,
+                 min_contrast=15.0, min_face_size=60, scale=0.5):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.min_face_size = min_face_size
+        self.scale = scale
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.counters = {"checked": 0}
+        self.counters.update((reason, 0) for reason in self.REASONS)
+
+    def stats(self):
+        return dict(self.counters)
+
+    def _reject(self, reason):
+        self.counters[reason] += 1
+        return reason
+
+    def check_frame(self, rgb_frame):
+        """Return the rejection reason for a frame, or None if it is usable."""
+        self.counters["checked"] += 1
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        if self.scale != 1.0:
+            gray = cv2.resize(gray, (0, 0), fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+
+        mean, std = cv2.meanStdDev(gray)
+        if mean[0][0] < self.min_brightness:
+            return self._reject("dark")
+        if mean[0][0] > self.max_brightness:
+            return self._reject("bright")
+        if std[0][0] < self.min_contrast:
+            return self._reject("low_contrast")
+        if sharpness(gray) < self.min_sharpness:
+            return self._reject("blurry")
+        return None
+
+    def check_face(self, face_location):
+        top, right, bottom, left = face_location
+        if min(bottom - top, right - left) < self.min_face_size:
+            return self._reject("small_face")
+        return None
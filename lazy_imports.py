@@ -0,0 +1,67 @@
+import importlib
+import sys
+import threading
+import time
+
+# Seconds spent in each import made through load(), in import order
+import_times = {}
+_lock = threading.Lock()
+
+# Heaviest first, so each entry's time excludes the modules before it
+WARM_UP_MODULES = (
+    "numpy",
+    "cv2",
+    "PIL.ImageTk",
+    "soundfile",
+    "sounddevice",
+    "face_recognition",
+    "verification_engine",
+    "capture_pipeline",
+    "preview_renderer",
+    "media_sources",
+    "voice_stream",
+)
+
+
+def load(name):
+    """Import a module on first use and record how long the import took."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        import_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def soundfile():
+    return load("soundfile")
+
+
+def warm_up(names=WARM_UP_MODULES, on_done=None):
+    """Import ``names`` on a daemon thread so they are ready before first use.
+
+    Failures are collected rather than raised; ``on_done(errors)`` is called
+    from the thread with a dict of module name to exception.
+    """
+    def run():
+        errors = {}
+        for name in names:
+            try:
+                load(name)
+            except Exception as e:
+                errors[name] = e
+        if on_done is not None:
+            on_done(errors)
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def format_import_times():
+    with _lock:
+        items = list(import_times.items())
+    return "\n".join(f"  import {name}: {seconds * 1000:.1f} ms" for name, seconds in items)
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import numpy as np
+
+
+async def request(reader, writer, method, path, body=b'', headers=None):
+    """Send one HTTP/1.1 request on a kept-alive connection; returns (status, body)."""
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the service")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def connect(host, port, unix_socket):
+    if unix_socket:
+        return await asyncio.open_unix_connection(unix_socket)
+    return await asyncio.open_connection(host, port)
+
+
+async def client(requests, host, port, unix_socket, stop_at, latencies, statuses, headers):
+    """One gate: send requests back to back over a single connection until ``stop_at``."""
+    reader, writer = await connect(host, port, unix_socket)
+    try:
+        for path, body in requests:
+            if time.perf_counter() >= stop_at:
+                break
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", path, body, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    requests = []
+    if args.face:
+        with open(args.face, 'rb') as f:
+            image = f.read()
+        if args.identify:
+            requests.append(("/identify/face", image))
+        if args.user:
+            requests.append((f"/verify/face?user={args.user}", image))
+    if args.voice:
+        if not args.user:
+            raise SystemExit("--voice needs --user: voice clips are verified against a claimed user")
+        with open(args.voice, 'rb') as f:
+            requests.append((f"/verify/voice?user={args.user}", f.read()))
+    if not requests:
+        raise SystemExit("nothing to send: give --face with --user or --identify, and/or --voice with --user")
+
+    headers = {"X-Deadline-Ms": f"{args.deadline_ms:g}"} if args.deadline_ms else None
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    # Each client cycles through the request mix from a different offset
+    await asyncio.gather(*[client(itertools.islice(itertools.cycle(requests), i, None), args.host, args.port,
+                                  args.unix_socket, stop_at, latencies, statuses, headers)
+                           for i in range(args.concurrency)])
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await connect(args.host, args.port, args.unix_socket)
+    try:
+        _, body = await request(reader, writer, "GET", "/stats")
+    finally:
+        writer.close()
+    return latencies, statuses, elapsed, json.loads(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure throughput and latency of the verification service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--face", help="JPEG/PNG image to send")
+    parser.add_argument("--voice", help="WAV clip to send")
+    parser.add_argument("--user", help="enrolled user to verify against")
+    parser.add_argument("--identify", action="store_true", help="also send 1:N face identification requests")
+    parser.add_argument("--concurrency", type=int, default=12, help="simultaneous clients (gates)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--deadline-ms", type=float, default=None, help="X-Deadline-Ms sent with every request")
+    args = parser.parse_args()
+
+    latencies, statuses, elapsed, stats = asyncio.run(run(args))
+
+    ms = np.asarray(latencies) * 1000.0
+    print(f"{len(ms)} requests from {args.concurrency} clients in {elapsed:.1f} s: "
+          f"{len(ms) / elapsed:.1f} requests/s")
+    if len(ms):
+        print(f"latency: mean {ms.mean():.1f} ms, p50 {np.percentile(ms, 50):.1f} ms, "
+              f"p99 {np.percentile(ms, 99):.1f} ms")
+    print("responses: " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    for name, batcher in stats["batchers"].items():
+        if batcher["batches"]:
+            print(f"{name}: {batcher['batches']} batches, mean size {batcher['mean_batch_size']:.2f}, "
+                  f"{batcher['overloaded']} overloaded, {batcher['expired']} expired")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import glob
+import json
+import os
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from bulk_enroll import load_audio
+
+
+class AudioSource:
+    """Mono float32 audio delivered in chunks; use as a context manager."""
+
+    def __init__(self, sample_rate=16000, chunk_size=1600):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+
+    def open(self):
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def chunks(self):
+        raise NotImplementedError
+
+    def record(self, duration):
+        """Collect ``duration`` seconds of audio (less if the source ends first)."""
+        needed = int(self.sample_rate * duration)
+        collected = []
+        total = 0
+        for chunk in self.chunks():
+            collected.append(chunk)
+            total += len(chunk)
+            if total >= needed:
+                break
+        audio = np.concatenate(collected) if collected else np.zeros(0, dtype=np.float32)
+        return audio[:needed]
+
+
+class MicrophoneSource(AudioSource):
+    """Live input from the default microphone."""
+
+    def __init__(self, sample_rate=16000, chunk_size=1600):
+        super().__init__(sample_rate, chunk_size)
+        self._stream = None
+        self._queue = None
+
+    def open(self):
+        # Imported here so replay works on machines without PortAudio
+        import sounddevice as sd
+
+        self._queue = queue.Queue()
+        self._stream = sd.InputStream(samplerate=self.sample_rate,
+                                      channels=1,
+                                      dtype='float32',
+                                      blocksize=self.chunk_size,
+                                      callback=self._callback)
+        self._stream.start()
+        return self
+
+    def _callback(self, indata, frames, time_info, status):
+        self._queue.put(indata[:, 0].copy())
+
+    def chunks(self):
+        while self._stream is not None:
+            try:
+                yield self._queue.get(timeout=1.0)
+            except queue.Empty:
+                return
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class WavFileSource(AudioSource):
+    """Replays a WAV file in place of the microphone.
+
+    With ``realtime`` the chunks are paced like live input; otherwise they
+    are delivered as fast as they are consumed.
+    """
+
+    def __init__(self, path, sample_rate=16000, chunk_size=1600, realtime=False):
+        super().__init__(sample_rate, chunk_size)
+        self.path = path
+        self.realtime = realtime
+        self._audio = None
+
+    def open(self):
+        self._audio = load_audio(self.path, self.sample_rate)
+        return self
+
+    def chunks(self):
+        started = time.perf_counter()
+        for offset in range(0, len(self._audio), self.chunk_size):
+            if self.realtime:
+                delay = started + offset / self.sample_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield self._audio[offset:offset + self.chunk_size]
+
+
+class FrameSource:
+    """BGR frames through the ``read()``/``release()`` calls of cv2.VideoCapture.
+
+    Anything that reads a VideoCapture, such as FrameGrabber, accepts a
+    FrameSource. ``frames()`` yields every frame in order, for callers that
+    must not drop any.
+    """
+
+    def open(self):
+        return self
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def frames(self, limit=None):
+        count = 0
+        while limit is None or count < limit:
+            ret, frame = self.read()
+            if not ret:
+                return
+            count += 1
+            yield frame
+
+
+class CameraSource(FrameSource):
+    """Live camera: the first of ``indices`` that opens and delivers a frame.
+
+    With ``settings_path`` the working index and the resolution the camera
+    actually delivered are saved there, and the next open() tries that
+    index first instead of probing every index again.
+    """
+
+    def __init__(self, indices=(0, 1, 2), width=640, height=480, settings_path=None):
+        self.indices = indices
+        self.width = width
+        self.height = height
+        self.settings_path = settings_path
+        self.index = None
+        self.resolution = None
+        self._cap = None
+
+    def _load_settings(self):
+        try:
+            with open(self.settings_path) as f:
+                return json.load(f)
+        except (OSError, ValueError, TypeError):
+            return {}
+
+    def _save_settings(self, settings):
+        try:
+            with open(self.settings_path, "w") as f:
+                json.dump(settings, f)
+        except OSError as e:
+            print(f"Error saving camera settings: {str(e)}")
+
+    def open(self):
+        settings = self._load_settings() if self.settings_path else {}
+        indices = list(self.indices)
+        if settings.get("index") in indices:
+            indices.remove(settings["index"])
+            indices.insert(0, settings["index"])
+
+        for index in indices:
+            cap = cv2.VideoCapture(index)
+            if cap.isOpened():
+                # Ask the remembered camera for the resolution it delivered last time
+                remembered = index == settings.get("index")
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, settings.get("width", self.width) if remembered else self.width)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, settings.get("height", self.height) if remembered else self.height)
+                # Test if we can actually read a frame
+                ret, frame = cap.read()
+                if ret:
+                    self._cap = cap
+                    self.index = index
+                    self.resolution = (frame.shape[1], frame.shape[0])
+                    break
+            cap.release()
+        else:
+            raise OSError(f"Could not open any camera (tried indices {', '.join(map(str, indices))})")
+
+        working = {"index": self.index, "width": self.resolution[0], "height": self.resolution[1]}
+        if self.settings_path and working != settings:
+            self._save_settings(working)
+        return self
+
+    def isOpened(self):
+        return self._cap is not None and self._cap.isOpened()
+
+    def read(self):
+        if self._cap is None:
+            return False, None
+        return self._cap.read()
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class _ReplaySource(FrameSource):
+    """Pacing shared by the replay sources: real time at ``fps`` or as fast as read."""
+
+    def __init__(self, fps=30.0, realtime=False, loop=False):
+        self.fps = fps
+        self.realtime = realtime
+        self.loop = loop
+        self._position = 0
+        self._started = None
+
+    def _pace(self):
+        if self._started is None:
+            self._started = time.perf_counter()
+        if self.realtime:
+            delay = self._started + self._position / self.fps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self._position += 1
+
+
+class VideoFileSource(_ReplaySource):
+    """Replays a video file in place of the camera, paced at the file's frame rate."""
+
+    def __init__(self, path, realtime=False, loop=False):
+        super().__init__(realtime=realtime, loop=loop)
+        self.path = path
+        self._cap = None
+
+    def open(self):
+        self._cap = cv2.VideoCapture(self.path)
+        if not self._cap.isOpened():
+            raise OSError(f"Could not open video {self.path}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or self.fps
+        return self
+
+    def isOpened(self):
+        return self._cap is not None
+
+    def read(self):
+        if self._cap is None:
+            return False, None
+        ret, frame = self._cap.read()
+        if not ret and self.loop:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._cap.read()
+        if ret:
+            self._pace()
+        return ret, frame
+
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class ImageSequenceSource(_ReplaySource):
+    """Replays image files (a directory, in name order, or a list of paths) as frames."""
+
+    def __init__(self, images, fps=30.0, realtime=False, loop=False):
+        super().__init__(fps, realtime, loop)
+        if isinstance(images, str):
+            images = sorted(path for pattern in ("*.jpg", "*.jpeg", "*.png")
+                            for path in glob.glob(os.path.join(images, pattern)))
+        self.paths = list(images)
+        self._next = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self._next >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self._next = 0
+        frame = cv2.imread(self.paths[self._next])
+        self._next += 1
+        if frame is None:
+            return False, None
+        self._pace()
+        return True, frame
@@ -0,0 +1,187 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# Upper bounds in seconds, from a fast numpy call to a slow camera open
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds, as Prometheus expects."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the maximum past the last bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))}
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """Named duration histograms fed by spans, plus a few gauges.
+
+    ``with metrics.span("detect"):`` or ``@metrics.timed("detect")`` time a
+    block or function. While disabled, span() returns a shared no-op object
+    and observe() returns at once, so leaving instrumentation in hot paths
+    costs an attribute check per call. set_gauge() records the current
+    value of something that goes up and down, such as a queue depth.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS, prefix="fvas"):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.prefix = prefix
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def observe_timings(self, prefix, timings):
+        """Record a stage -> seconds dict, such as a result's ``timings``."""
+        if not self.enabled:
+            return
+        for stage, seconds in timings.items():
+            self.observe(f"{prefix}_{stage}", seconds)
+
+    def set_gauge(self, name, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[name] = value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._gauges.clear()
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+            snapshot.update((name, {"value": value}) for name, value in sorted(self._gauges.items()))
+            return snapshot
+
+    def to_prometheus(self):
+        """Prometheus text exposition format, one histogram series per span name."""
+        metric = f"{self.prefix}_span_duration_seconds"
+        lines = [f"# HELP {metric} Duration of instrumented spans.",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{span="{name}"}} {histogram.sum}')
+                lines.append(f'{metric}_count{{span="{name}"}} {histogram.count}')
+            if self._gauges:
+                gauge = f"{self.prefix}_gauge"
+                lines += [f"# HELP {gauge} Current value of instrumented gauges.",
+                          f"# TYPE {gauge} gauge"]
+                lines += [f'{gauge}{{name="{name}"}} {value}' for name, value in sorted(self._gauges.items())]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write a JSON snapshot (``.json``) or Prometheus text file (anything else).
+
+        The file is replaced atomically, so a node_exporter textfile
+        collector never reads a partial file.
+        """
+        if path.endswith(".json"):
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+# Process-wide registry; enable it with FVAS_METRICS=1 or the app's --metrics-file
+metrics = Metrics(enabled=os.environ.get("FVAS_METRICS") == "1")
@@ -0,0 +1,102 @@
+import threading
+import time
+import tkinter as tk
+
+import cv2
+from PIL import Image, ImageTk
+
+from metrics import metrics
+
+# Box colours (RGB) for the latest detection result
+BOX_ACCEPTED = (0, 200, 0)
+BOX_REJECTED = (230, 160, 0)
+BOX_NO_MATCH = (220, 0, 0)
+
+
+class PreviewRenderer:
+    """Camera preview drawn on the Tk thread, independently of recognition.
+
+    An after() loop shows the grabber's newest frame at most ``max_fps``
+    times a second, downscaled to at most ``max_width`` pixels wide, by
+    pasting it into a single PhotoImage instead of allocating one per frame.
+    Recognition results arrive separately through set_boxes() and are drawn
+    over whatever frame is current until they are ``box_ttl`` seconds old.
+    """
+
+    def __init__(self, widget, grabber, max_fps=15, max_width=480, box_ttl=1.0):
+        self.widget = widget
+        self.grabber = grabber
+        self.interval_ms = max(1, int(1000 / max_fps))
+        self.max_width = max_width
+        self.box_ttl = box_ttl
+        self.frames_drawn = 0
+        self.started_at = None
+        self._photo = None
+        self._last_id = 0
+        self._boxes = []
+        self._boxes_shape = None
+        self._boxes_at = 0.0
+        self._lock = threading.Lock()
+        self._after_id = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._after_id = self.widget.after(0, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except tk.TclError:
+                pass
+            self._after_id = None
+
+    def set_boxes(self, locations, frame_shape, color=BOX_ACCEPTED):
+        """Overlay (top, right, bottom, left) boxes found in a frame of ``frame_shape``.
+
+        Safe to call from any thread.
+        """
+        with self._lock:
+            self._boxes = [(location, color) for location in locations]
+            self._boxes_shape = frame_shape[:2]
+            self._boxes_at = time.perf_counter()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {"frames_drawn": self.frames_drawn,
+                "fps": self.frames_drawn / elapsed if elapsed else 0.0}
+
+    def _tick(self):
+        try:
+            item = self.grabber.latest(self._last_id, timeout=0)
+            if item is not None:
+                self._last_id = item[0]
+                with metrics.span("preview_render"):
+                    self._draw(item[2])
+                self.frames_drawn += 1
+        except tk.TclError:
+            self._after_id = None
+            return  # The label was destroyed with its screen
+        self._after_id = self.widget.after(self.interval_ms, self._tick)
+
+    def _draw(self, rgb_frame):
+        height, width = rgb_frame.shape[:2]
+        scale = min(1.0, self.max_width / width)
+        size = (int(width * scale), int(height * scale))
+        small = cv2.resize(rgb_frame, size, interpolation=cv2.INTER_AREA) if scale < 1.0 else rgb_frame.copy()
+
+        with self._lock:
+            boxes = self._boxes if time.perf_counter() - self._boxes_at <= self.box_ttl else []
+            boxes_shape = self._boxes_shape
+        if boxes:
+            box_scale = size[1] / boxes_shape[0]
+            for (top, right, bottom, left), color in boxes:
+                cv2.rectangle(small, (int(left * box_scale), int(top * box_scale)),
+                              (int(right * box_scale), int(bottom * box_scale)), color, 2)
+
+        image = Image.fromarray(small)
+        if self._photo is None or self._photo.width() != size[0] or self._photo.height() != size[1]:
+            self._photo = ImageTk.PhotoImage(image)
+            self.widget.config(image=self._photo)
+        else:
+            self._photo.paste(image)
@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+
+
+class ScoreFusion:
+    """Score-level fusion of a face distance and a voice distance.
+
+    Each distance is turned into log-odds of a genuine match: zero at that
+    modality's threshold, one more for every ``scale`` below it. The
+    weighted sum gives the fused confidence through the logistic function.
+    An early decision needs evidence from both modalities and a confidence
+    of at least ``accept_confidence`` or at most ``reject_confidence``;
+    once both are done, a confidence of 0.5 is the boundary and a missing
+    modality rejects.
+
+    Each modality also has a veto, so a good match on one side can only
+    make up for a borderline match on the other, never for a failing one:
+    nothing is accepted with a face distance above ``face_veto`` (default
+    the face threshold) or a voice distance above ``voice_veto`` (default
+    1.5 times the voice threshold, where the streaming voice verifier
+    rejects early). A vetoed voice rejects at once, as it would on its
+    own; a vetoed face waits for the final decision, since later frames
+    can still match.
+    """
+
+    def __init__(self, face_threshold=0.5, voice_threshold=20.0, face_scale=0.05, voice_scale=4.0,
+                 face_weight=1.0, voice_weight=1.0, accept_confidence=0.99, reject_confidence=0.01,
+                 face_veto=None, voice_veto=None):
+        self.face_threshold = face_threshold
+        self.voice_threshold = voice_threshold
+        self.face_scale = face_scale
+        self.voice_scale = voice_scale
+        self.face_weight = face_weight
+        self.voice_weight = voice_weight
+        self.accept_confidence = accept_confidence
+        self.reject_confidence = reject_confidence
+        self.face_veto = face_threshold if face_veto is None else face_veto
+        self.voice_veto = 1.5 * voice_threshold if voice_veto is None else voice_veto
+
+    def log_odds(self, face_distance=None, voice_distance=None):
+        log_odds = 0.0
+        if face_distance is not None:
+            log_odds += self.face_weight * (self.face_threshold - face_distance) / self.face_scale
+        if voice_distance is not None:
+            log_odds += self.voice_weight * (self.voice_threshold - voice_distance) / self.voice_scale
+        return log_odds
+
+    def confidence(self, face_distance=None, voice_distance=None):
+        log_odds = min(max(self.log_odds(face_distance, voice_distance), -50.0), 50.0)
+        return 1.0 / (1.0 + math.exp(-log_odds))
+
+    def decide(self, face_distance=None, voice_distance=None, final=False):
+        """True to accept, False to reject, or None while undecided."""
+        both = face_distance is not None and voice_distance is not None
+        face_vetoed = face_distance is not None and face_distance > self.face_veto
+        voice_vetoed = voice_distance is not None and voice_distance > self.voice_veto
+        if voice_vetoed or (face_vetoed and final):
+            return False
+        confidence = self.confidence(face_distance, voice_distance)
+        if face_vetoed:
+            return None
+        if both and confidence >= self.accept_confidence:
+            return True
+        if both and confidence <= self.reject_confidence:
+            return False
+        if final:
+            return both and confidence >= 0.5
+        return None
+
+
+class FusedVerification:
+    """Face and voice verification of one user at the same time.
+
+    The voice is recorded and verified on its own thread while face
+    results come from ``pipeline``, a CapturePipeline in verify mode.
+    Call poll() regularly: it feeds new face results into ``fusion`` and
+    returns them, and sets ``decision`` once the fused confidence is
+    decisive or both modalities are done. The voice thread stops listening
+    as soon as there is a decision, so the wall time is close to the
+    slower of the two rather than their sum.
+    """
+
+    def __init__(self, fusion, pipeline, voice_stream, audio_source, stored_signature, max_face_attempts=20,
+                 voiced_signature=True):
+        self.fusion = fusion
+        self.pipeline = pipeline
+        self.voice_stream = voice_stream
+        self.audio_source = audio_source
+        self.stored_signature = stored_signature
+        self.voiced_signature = voiced_signature
+        self.max_face_attempts = max_face_attempts
+        self.face_distance = None
+        self.face_attempts = 0
+        self.face_rejections = 0
+        self.voice_distance = None
+        self.voice_result = None
+        self.voice_error = None
+        self.voice_done = False
+        self.heard = 0.0
+        self.voiced = 0.0
+        self.decision = None
+        self.started_at = None
+        self.decided_at = None
+        self._stopped = False
+        self._voice_thread = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self.pipeline.start()
+        self._voice_thread = threading.Thread(target=self._listen, daemon=True)
+        self._voice_thread.start()
+
+    def _listen(self):
+        try:
+            with self.audio_source as source:
+                result = self.voice_stream.verify(source, self.stored_signature, self._on_voice_progress,
+                                                  should_stop=lambda: self._stopped or self.decision is not None,
+                                                  voiced_only=self.voiced_signature)
+            self.voice_result = result
+            if result.score is not None:
+                self.voice_distance = result.score
+        except Exception as e:
+            self.voice_error = e
+        finally:
+            self.voice_done = True
+
+    def _on_voice_progress(self, heard, voiced, distance):
+        self.heard, self.voiced = heard, voiced
+        # The running distance is too noisy to use before enough speech is heard
+        if distance is not None and voiced >= self.voice_stream.min_voiced:
+            self.voice_distance = distance
+
+    @property
+    def face_done(self):
+        return (self.face_attempts >= self.max_face_attempts
+                or self.face_rejections >= self.max_face_attempts * 5)
+
+    def poll(self):
+        """Return the face results that completed since the last poll."""
+        items = self.pipeline.poll()
+        for item in items:
+            result = item.result
+            if result is None or result.rejected:
+                self.face_rejections += 1
+                continue
+            self.face_attempts += 1
+            if result.score is not None:
+                self.face_distance = (result.score if self.face_distance is None
+                                      else min(self.face_distance, result.score))
+
+        if self.decision is None and self.voice_error is not None:
+            # Without a voice check there is nothing to fuse
+            self.decision = False
+            self.decided_at = time.perf_counter()
+        if self.decision is None:
+            self.decision = self.fusion.decide(self.face_distance, self.voice_distance,
+                                               final=self.face_done and self.voice_done)
+            if self.decision is not None:
+                self.decided_at = time.perf_counter()
+        return items
+
+    def confidence(self):
+        return self.fusion.confidence(self.face_distance, self.voice_distance)
+
+    def elapsed(self):
+        return (self.decided_at or time.perf_counter()) - self.started_at
+
+    def stats(self):
+        return {"decision": self.decision,
+                "confidence": self.confidence(),
+                "face_distance": self.face_distance,
+                "face_attempts": self.face_attempts,
+                "voice_distance": self.voice_distance,
+                "voice_error": self.voice_error,
+                "heard": self.heard,
+                "elapsed": self.elapsed()}
+
+    def stop(self):
+        self._stopped = True
+        self.pipeline.stop()
+        if self._voice_thread is not None:
+            self._voice_thread.join()
@@ -10,7 +10,6 @@ setup(
         "numpy>=1.24.0",
         "sounddevice>=0.4.5",
         "soundfile>=0.12.1",
-        "librosa>=0.10.0",
         "pillow>=9.4.0",
     ],
     author="Gangadhar",
@@ -11,7 +11,6 @@ def check_dependencies():
         'numpy': 'numpy',
         'sounddevice': 'sounddevice',
         'soundfile': 'soundfile',
-        'librosa': 'librosa',
         'pillow': 'PIL'
     }
     
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from enrollment_store import EnrollmentRecord
+from metrics import metrics
+
+
+class TemplateCache:
+    """Bounded LRU cache of decoded enrollment records, keyed by username.
+
+    The whole cache is dropped when the store file's mtime or size changes,
+    and single users can be dropped with invalidate() after re-enrollment.
+    """
+
+    def __init__(self, store, maxsize=256):
+        self.store = store
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = self._file_stamp()
+
+    def _file_stamp(self):
+        st = os.stat(self.store.path)
+        return st.st_mtime_ns, st.st_size
+
+    @metrics.timed("template_lookup")
+    def get(self, username):
+        """Return a user's record, reading the store only on a miss."""
+        stamp = self._file_stamp()
+
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+                self.store.refresh()
+
+            record = self._entries.get(username)
+            if record is not None:
+                self._entries.move_to_end(username)
+                self.hits += 1
+                return record
+            self.misses += 1
+
+        stored = self.store.get(username)
+        if stored is None:
+            return None
+
+        # Copy out of the store's mmap so cached records stay valid on remap
+        record = EnrollmentRecord(username,
+                                  np.array(stored.face_encodings),
+                                  np.array(stored.voice_signature),
+                                  stored.passphrase,
+                                  stored.voiced_signature)
+
+        with self._lock:
+            self._entries[username] = record
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return record
+
+    def invalidate(self, username=None):
+        """Drop one user, or everything when no username is given."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
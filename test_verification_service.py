@@ -0,0 +1,46 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from verification_service import DeadlineExceeded, MicroBatcher, nearest_distances
+
+
+def test_nearest_distances_mixes_users_with_and_without_encodings():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(4, 128))
+    stored = [np.empty((0, 128)), rng.normal(size=(2, 128)), np.empty((0, 128)), rng.normal(size=(3, 128))]
+
+    distances = nearest_distances(queries, stored)
+
+    assert np.isinf(distances[0]) and np.isinf(distances[2])
+    for i in (1, 3):
+        assert np.isclose(distances[i], np.linalg.norm(stored[i] - queries[i], axis=1).min())
+
+
+def test_nearest_distances_without_any_encodings():
+    distances = nearest_distances(np.zeros((2, 128)), [np.empty((0, 128)), np.empty((0, 128))])
+
+    assert np.isinf(distances).all()
+
+
+def test_micro_batcher_never_processes_requests_past_their_deadline():
+    processed = []
+
+    async def process(items):
+        processed.extend(items)
+        return items
+
+    async def run():
+        batcher = MicroBatcher("test", process, max_wait=0.0)
+        batcher.start()
+        now = asyncio.get_running_loop().time()
+        for deadline in (float("nan"), now - 1.0):
+            with pytest.raises(DeadlineExceeded):
+                await batcher.submit("late", deadline)
+        result = await batcher.submit("on time", now + 1.0)
+        batcher.stop()
+        return result
+
+    assert asyncio.run(run()) == "on time"
+    assert processed == ["on time"]
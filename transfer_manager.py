@@ -0,0 +1,147 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from file_store import TransferCancelled
+from metrics import metrics
+
+
+class Transfer:
+    """One queued upload or download between a local file and a file store."""
+
+    def __init__(self, transfer_id, kind, username, filename, local_path, total):
+        self.id = transfer_id
+        self.kind = kind
+        self.username = username
+        self.filename = filename
+        self.local_path = local_path
+        self.total = total
+        self.done = 0
+        self.state = "queued"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.cancelled = False
+
+    def cancel(self):
+        """Stop the transfer before it starts, or at its next chunk."""
+        self.cancelled = True
+
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def throughput(self):
+        """Bytes per second since the transfer started."""
+        elapsed = self.elapsed()
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def _progress(self, done):
+        self.done = done
+
+
+class TransferManager:
+    """Runs uploads to and downloads from a file store on a pool of worker threads.
+
+    Transfers start in the order they were queued, ``workers`` at a time.
+    The store streams each one in chunks, reporting progress to its
+    Transfer, and stops it at the next chunk once cancelled. Every
+    transfer that ends, whether done, failed or cancelled, is put on the
+    ``finished`` queue, for the UI thread to collect when it polls; it is
+    queued before it leaves active(), so a poll that finds no active
+    transfers has every finished one queued already.
+    """
+
+    def __init__(self, store, workers=2):
+        self.store = store
+        self.finished = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transfer")
+        self._ids = itertools.count(1)
+        self._active = []
+        self._lock = threading.Lock()
+        self.counters = {"done": 0, "failed": 0, "cancelled": 0, "bytes": 0}
+
+    def upload(self, username, source_path, filename=None):
+        filename = filename or os.path.basename(source_path)
+        return self._submit("upload", username, filename, source_path, os.path.getsize(source_path))
+
+    def download(self, username, filename, destination):
+        size, _ = self.store.stat(username, filename)
+        return self._submit("download", username, filename, destination, size)
+
+    def _submit(self, kind, username, filename, local_path, total):
+        transfer = Transfer(next(self._ids), kind, username, filename, local_path, total)
+        with self._lock:
+            self._active.append(transfer)
+        self._executor.submit(self._run, transfer)
+        return transfer
+
+    def _run(self, transfer):
+        if transfer.cancelled:
+            transfer.state = "cancelled"
+        else:
+            transfer.state = "running"
+            transfer.started_at = time.perf_counter()
+            should_stop = lambda: transfer.cancelled
+            try:
+                with metrics.span(f"file_{transfer.kind}"):
+                    if transfer.kind == "upload":
+                        self.store.upload(transfer.username, transfer.local_path, transfer.filename,
+                                          transfer._progress, should_stop)
+                    else:
+                        self.store.download(transfer.username, transfer.filename, transfer.local_path,
+                                            transfer._progress, should_stop)
+                transfer.state = "done"
+            except TransferCancelled:
+                transfer.state = "cancelled"
+            except Exception as e:
+                transfer.state = "failed"
+                transfer.error = e
+            transfer.finished_at = time.perf_counter()
+
+        with self._lock:
+            self.counters[transfer.state] += 1
+            if transfer.state == "done":
+                self.counters["bytes"] += transfer.total
+            self.finished.put(transfer)
+            self._active.remove(transfer)
+
+    def active(self):
+        """Queued and running transfers, in queue order."""
+        with self._lock:
+            return list(self._active)
+
+    def cancel_all(self):
+        for transfer in self.active():
+            transfer.cancel()
+
+    def stats(self):
+        active = self.active()
+        return dict(self.counters,
+                    running=sum(1 for transfer in active if transfer.state == "running"),
+                    queued=sum(1 for transfer in active if transfer.state == "queued"))
+
+    def finished_transfers(self):
+        """Take every transfer that has ended since the last call."""
+        transfers = []
+        while True:
+            try:
+                transfers.append(self.finished.get_nowait())
+            except queue.Empty:
+                return transfers
+
+    def shutdown(self, wait=True):
+        """Cancel every transfer and stop the workers, waiting for them unless ``wait`` is False.
+
+        Running transfers stop at their next chunk and remove their partial
+        files either way.
+        """
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,305 @@
+import time
+
+import numpy as np
+import face_recognition
+
+from face_detection import CascadeFaceDetector, HogFaceDetector, load_haar_cascade
+from face_tracking import TrackingFaceDetector
+from frame_quality import FrameQualityGate, quality_score
+from voice_activity import EnergyVAD
+from voice_features import frame_rms, mfcc
+
+
+class EnrollmentResult:
+    """Template produced from one face frame or voice clip."""
+
+    def __init__(self, template, timings, face_location=None, quality=None, rejected=None):
+        self.template = template
+        self.timings = timings
+        self.face_location = face_location
+        self.quality = quality
+        self.rejected = rejected
+
+    @property
+    def ok(self):
+        return self.template is not None
+
+
+class VerificationResult:
+    """Decision, score and per-stage timings for one verification.
+
+    ``template`` is the probe's own signature when the verifier keeps it.
+    """
+
+    def __init__(self, accepted, score, threshold, timings, face_location=None, username=None, rejected=None,
+                 template=None):
+        self.accepted = accepted
+        self.score = score
+        self.threshold = threshold
+        self.timings = timings
+        self.face_location = face_location
+        self.username = username
+        self.rejected = rejected
+        self.template = template
+
+
+class FaceVoiceVerifier:
+    """Headless face and voice enrollment/verification on numpy inputs.
+
+    Face frames are RGB uint8 arrays, audio clips are mono float32 arrays.
+    Every call returns per-stage timings in seconds so each stage can be
+    measured independently of the GUI. ``detection_scale`` runs face
+    detection on a downscaled frame; ``detector`` replaces the default
+    detector with any object that has a ``detect(rgb_frame)`` method.
+    An optional ``quality_gate`` rejects unusable frames before detection
+    and encoding; the reason is reported in the result's ``rejected``.
+    With ``voice_activity`` voice signatures average only the voiced frames.
+    """
+
+    # Default operating points; evaluate.py reports error rates at these
+    FACE_TOLERANCE = 0.5
+    VOICE_THRESHOLD = 20.0
+
+    def __init__(self, face_tolerance=FACE_TOLERANCE, voice_threshold=VOICE_THRESHOLD, sample_rate=16000,
+                 n_mfcc=13, detection_scale=1.0, detector=None, quality_gate=None, voice_activity=None):
+        self.detector = detector or HogFaceDetector(scale=detection_scale)
+        self.quality_gate = quality_gate
+        self.voice_activity = voice_activity
+        self.face_tolerance = face_tolerance
+        self.voice_threshold = voice_threshold
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+
+    def warm_up(self, face=True, voice=True, frame_shape=(480, 640, 3)):
+        """Run each stage once on synthetic input so the first real call is not slower.
+
+        Pays dlib's first-call costs and builds the cached MFCC matrices;
+        detector state and all counters are reset afterwards. Returns the
+        per-stage timings of the warm-up itself.
+        """
+        timings = {}
+        rng = np.random.default_rng(0)
+
+        if face:
+            frame = rng.integers(0, 256, frame_shape, dtype=np.uint8)
+            self.encode_face(frame, timings)
+
+            # There is no face in the frame, so run HOG and the encoder on a fixed box directly
+            height, width = frame_shape[:2]
+            box = (height // 4, width * 3 // 4, height * 3 // 4, width // 4)
+            start = time.perf_counter()
+            face_recognition.face_locations(frame[box[0]:box[2], box[3]:box[1]])
+            timings['hog'] = time.perf_counter() - start
+            start = time.perf_counter()
+            face_recognition.face_encodings(frame, [box])
+            timings['encode'] = time.perf_counter() - start
+
+            if hasattr(self.detector, "reset"):
+                self.detector.reset()
+            if hasattr(self.detector, "reset_counters"):
+                self.detector.reset_counters()
+            if self.quality_gate is not None:
+                self.quality_gate.reset_counters()
+
+        if voice:
+            self.voice_signature(rng.normal(0, 0.1, self.sample_rate).astype(np.float32), timings)
+
+        return timings
+
+    # Face
+
+    def encode_face(self, rgb_frame, timings=None):
+        """Detect the first face in a frame and return (encoding, location, rejected).
+
+        ``rejected`` is the quality gate's reason when the frame was skipped.
+        """
+        if timings is None:
+            timings = {}
+
+        if self.quality_gate is not None:
+            start = time.perf_counter()
+            rejected = self.quality_gate.check_frame(rgb_frame)
+            timings['quality'] = time.perf_counter() - start
+            if rejected:
+                return None, None, rejected
+
+        start = time.perf_counter()
+        face_locations = self.detector.detect(rgb_frame)
+        timings['detect'] = time.perf_counter() - start
+
+        if not face_locations:
+            return None, None, None
+
+        if self.quality_gate is not None:
+            rejected = self.quality_gate.check_face(face_locations[0])
+            if rejected:
+                return None, face_locations[0], rejected
+
+        start = time.perf_counter()
+        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations[:1])
+        timings['encode'] = time.perf_counter() - start
+
+        if not face_encodings:
+            return None, None, None
+        return face_encodings[0], face_locations[0], None
+
+    def enroll_face(self, rgb_frame):
+        timings = {}
+        encoding, location, rejected = self.encode_face(rgb_frame, timings)
+        quality = quality_score(rgb_frame, location) if encoding is not None else None
+        return EnrollmentResult(encoding, timings, location, quality, rejected)
+
+    def enroll_face_batch(self, rgb_frames):
+        return [self.enroll_face(frame) for frame in rgb_frames]
+
+    def verify_face(self, rgb_frame, stored_encodings):
+        """Compare the face in a frame against a user's stored encodings.
+
+        The score is the smallest face distance; lower is better.
+        """
+        timings = {}
+        encoding, location, rejected = self.encode_face(rgb_frame, timings)
+        if encoding is None:
+            return VerificationResult(False, None, self.face_tolerance, timings, location, rejected=rejected)
+
+        start = time.perf_counter()
+        distances = face_recognition.face_distance(np.asarray(stored_encodings), encoding)
+        score = float(np.min(distances)) if len(distances) else None
+        timings['compare'] = time.perf_counter() - start
+
+        accepted = score is not None and score <= self.face_tolerance
+        return VerificationResult(accepted, score, self.face_tolerance, timings, location)
+
+    def verify_face_batch(self, rgb_frames, stored_encodings):
+        return [self.verify_face(frame, stored_encodings) for frame in rgb_frames]
+
+    def identify_face(self, rgb_frame, face_index):
+        """Find the enrolled user closest to the face in a frame (1:N)."""
+        timings = {}
+        encoding, location, rejected = self.encode_face(rgb_frame, timings)
+        if encoding is None:
+            return VerificationResult(False, None, self.face_tolerance, timings, location, rejected=rejected)
+
+        start = time.perf_counter()
+        username, score = face_index.identify(encoding, self.face_tolerance)
+        timings['identify'] = time.perf_counter() - start
+
+        return VerificationResult(username is not None, score, self.face_tolerance, timings,
+                                  location, username)
+
+    # Voice
+
+    @property
+    def voiced_signatures(self):
+        """Whether enrolled voice signatures average only the voiced frames."""
+        return self.voice_activity is not None
+
+    def voice_signatures(self, audio_batch, timings=None, voiced_only=True):
+        """Mean-MFCC signatures for an array of shape (batch, samples).
+
+        With ``voiced_only=False`` every frame is averaged even when there
+        is a voice activity detector, to match signatures enrolled that way.
+        """
+        if timings is None:
+            timings = {}
+
+        audio_batch = np.asarray(audio_batch, dtype=np.float32)
+        start = time.perf_counter()
+        mfcc_features = mfcc(audio_batch, self.sample_rate, self.n_mfcc)
+        timings['mfcc'] = time.perf_counter() - start
+
+        if self.voice_activity is None or not voiced_only:
+            return np.mean(mfcc_features, axis=-1)
+
+        start = time.perf_counter()
+        # Same framing as the MFCC defaults, so RMS frames line up with MFCC frames
+        rms = frame_rms(audio_batch)
+        signatures = np.empty(mfcc_features.shape[:2], dtype=np.float32)
+        for i, (features, energy) in enumerate(zip(mfcc_features, rms)):
+            voiced, _ = self.voice_activity.mask(energy)
+            # A clip with no detected speech falls back to every frame
+            signatures[i] = features[:, voiced].mean(axis=1) if voiced.any() else features.mean(axis=1)
+        timings['vad'] = time.perf_counter() - start
+        return signatures
+
+    def voice_signature(self, audio, timings=None):
+        return self.voice_signatures(np.asarray(audio).reshape(1, -1), timings)[0]
+
+    def enroll_voice(self, audio):
+        timings = {}
+        signature = self.voice_signature(audio, timings)
+        return EnrollmentResult(signature, timings)
+
+    def enroll_voice_batch(self, audio_batch):
+        """Enroll equal-length clips with a single MFCC call."""
+        timings = {}
+        signatures = self.voice_signatures(audio_batch, timings)
+        per_item = {stage: elapsed / len(signatures) for stage, elapsed in timings.items()}
+        return [EnrollmentResult(signature, dict(per_item)) for signature in signatures]
+
+    def verify_voice(self, audio, stored_signature, voiced_only=True):
+        """Compare a clip against a stored signature; the score is the Euclidean distance.
+
+        ``voiced_only`` must match how the stored signature was averaged
+        (the record's ``voiced_signature``).
+        """
+        return self.verify_voice_batch(np.asarray(audio).reshape(1, -1), stored_signature, voiced_only)[0]
+
+    def verify_voice_batch(self, audio_batch, stored_signature, voiced_only=True):
+        timings = {}
+        signatures = self.voice_signatures(audio_batch, timings, voiced_only)
+
+        start = time.perf_counter()
+        distances = np.linalg.norm(signatures - np.asarray(stored_signature), axis=1)
+        timings['compare'] = time.perf_counter() - start
+
+        per_item = {stage: elapsed / len(signatures) for stage, elapsed in timings.items()}
+        return [VerificationResult(bool(distance < self.voice_threshold), float(distance),
+                                   self.voice_threshold, dict(per_item), template=signature)
+                for distance, signature in zip(distances, signatures)]
+
+
+def select_enrollment_templates(results, count=5, diversity_weight=0.5):
+    """Pick ``count`` good and mutually different face encodings.
+
+    Starts from the highest-quality result, then greedily adds the one that
+    best balances its own quality against its distance to those already
+    picked, so near-duplicate frames are not enrolled twice.
+    """
+    candidates = [result for result in results if result is not None and result.ok]
+    if len(candidates) <= count:
+        return [result.template for result in candidates]
+
+    encodings = np.array([result.template for result in candidates])
+    quality = np.array([result.quality or 0.0 for result in candidates])
+    quality = (quality - quality.min()) / (np.ptp(quality) or 1.0)
+
+    selected = [int(np.argmax(quality))]
+    nearest = np.linalg.norm(encodings - encodings[selected[0]], axis=1)
+    while len(selected) < count:
+        diversity = nearest / (nearest.max() or 1.0)
+        score = (1.0 - diversity_weight) * quality + diversity_weight * diversity
+        score[selected] = -np.inf
+        best = int(np.argmax(score))
+        selected.append(best)
+        nearest = np.minimum(nearest, np.linalg.norm(encodings - encodings[best], axis=1))
+
+    return [candidates[i].template for i in selected]
+
+
+def create_verifier(haar_cascade=None, tracking=True, motion_threshold=2.0, **kwargs):
+    """FaceVoiceVerifier with the staged, tracking face detector used by the app.
+
+    Tracking and the motion gate assume consecutive frames of one video;
+    pass ``tracking=False`` and ``motion_threshold=None`` when frames are
+    unrelated photos or come from several cameras. A ``detector`` keyword
+    replaces the staged detector, and ``quality_gate=None`` turns the
+    quality gate off. Top-level so worker processes can build their own copy.
+    """
+    if "detector" not in kwargs:
+        detector = CascadeFaceDetector(haar_cascade or load_haar_cascade(), hog=HogFaceDetector(scale=0.5),
+                                       motion_threshold=motion_threshold)
+        kwargs["detector"] = TrackingFaceDetector(detector) if tracking else detector
+    kwargs.setdefault("quality_gate", FrameQualityGate())
+    kwargs.setdefault("voice_activity", EnergyVAD())
+    return FaceVoiceVerifier(**kwargs)
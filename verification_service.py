@@ -0,0 +1,531 @@
+import argparse
+import asyncio
+import io
+import json
+import math
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from bulk_enroll import load_audio
+from enrollment_store import EnrollmentStore
+from face_index import FaceIndex
+from metrics import metrics
+from template_cache import TemplateCache
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+               504: "Gateway Timeout"}
+
+_verifier = None
+
+
+def _init_worker(sample_rate, quality_gate):
+    """Build one warmed-up verifier per worker process."""
+    global _verifier
+    from frame_quality import FrameQualityGate
+    from verification_engine import create_verifier
+
+    # Consecutive frames come from different gates, so no tracking or motion gate
+    _verifier = create_verifier(tracking=False, motion_threshold=None, sample_rate=sample_rate,
+                                quality_gate=FrameQualityGate() if quality_gate else None)
+    _verifier.warm_up()
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _encode_faces(images):
+    """(encoding, location, rejected, error) for each JPEG/PNG in a batch; runs in a worker."""
+    import cv2
+
+    results = []
+    for data in images:
+        try:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError("cannot decode image")
+            encoding, location, rejected = _verifier.encode_face(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            results.append((encoding, location, rejected, None))
+        except Exception as e:
+            results.append((None, None, None, str(e)))
+    return results
+
+
+def _voice_signatures(clips):
+    """(signature, error) for each (WAV clip, voiced_only) in a batch; runs in a worker.
+
+    Clips of equal length, the usual case for fixed-length gate
+    recordings, share one MFCC call. ``voiced_only`` follows the claimed
+    user's record, whose signature may average every frame.
+    """
+    results = [None] * len(clips)
+    by_length = {}
+    for i, (data, voiced_only) in enumerate(clips):
+        try:
+            audio = load_audio(io.BytesIO(data), _verifier.sample_rate)
+            by_length.setdefault((len(audio), voiced_only), []).append((i, audio))
+        except Exception as e:
+            results[i] = (None, str(e))
+
+    for (_, voiced_only), group in by_length.items():
+        signatures = _verifier.voice_signatures(np.stack([audio for _, audio in group]), voiced_only=voiced_only)
+        for (i, _), signature in zip(group, signatures):
+            results[i] = (signature, None)
+    return results
+
+
+def nearest_distances(queries, stored):
+    """Distance from each query to the closest of its own stored templates.
+
+    ``stored`` holds one (n_i, dim) array per query. All pairs are
+    evaluated in one vectorized pass and reduced per query. A query with
+    no stored templates gets an infinite distance.
+    """
+    counts = np.array([len(templates) for templates in stored])
+    result = np.full(len(queries), np.inf)
+    present = np.flatnonzero(counts)
+    if not len(present):
+        return result
+
+    # reduceat cannot take empty segments, so only users with templates are reduced
+    counts = counts[present]
+    rows = np.concatenate([np.asarray(stored[i], dtype=np.float64).reshape(counts[j], -1)
+                           for j, i in enumerate(present)])
+    owners = np.repeat(present, counts)
+    distances = np.linalg.norm(rows - np.asarray(queries, dtype=np.float64)[owners], axis=1)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    result[present] = np.minimum.reduceat(distances, starts)
+    return result
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class MicroBatcher:
+    """Collects requests that arrive close together into one batched call.
+
+    A batch is closed after ``max_batch`` requests or ``max_wait`` seconds
+    after its first request, whichever comes first, and then handed to
+    ``process(items)``, a coroutine returning one result (or exception)
+    per item. Up to ``max_in_flight`` batches run at once. submit() raises
+    Overloaded when ``max_pending`` requests are already waiting, and
+    requests whose deadline passes while queued are dropped from the batch.
+    """
+
+    def __init__(self, name, process, max_batch=16, max_wait=0.005, max_pending=256, max_in_flight=1):
+        self.name = name
+        self.process = process
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.counters = {"requests": 0, "batches": 0, "batched_items": 0, "overloaded": 0, "expired": 0}
+        self._pending = deque()
+        self._arrived = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    @property
+    def depth(self):
+        return len(self._pending)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["queue_depth"] = self.depth
+        stats["mean_batch_size"] = (self.counters["batched_items"] / self.counters["batches"]
+                                    if self.counters["batches"] else None)
+        return stats
+
+    async def submit(self, item, deadline):
+        """Queue ``item`` and wait for its result; ``deadline`` is a loop.time() value."""
+        self.counters["requests"] += 1
+        if len(self._pending) >= self.max_pending:
+            self.counters["overloaded"] += 1
+            raise Overloaded()
+
+        loop = asyncio.get_running_loop()
+        if not deadline > loop.time():
+            # Already past (or not a number): never queued, so never processed
+            self.counters["expired"] += 1
+            raise DeadlineExceeded()
+        future = loop.create_future()
+        self._pending.append((item, deadline, future, loop.time()))
+        metrics.set_gauge(f"service_{self.name}_queue_depth", len(self._pending))
+        self._arrived.set()
+
+        try:
+            return await asyncio.wait_for(future, max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded() from None
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        while not self._pending:
+            self._arrived.clear()
+            await self._arrived.wait()
+
+        # Give requests arriving within max_wait of the first one a chance to join
+        closes_at = self._pending[0][3] + self.max_wait
+        while len(self._pending) < self.max_batch and loop.time() < closes_at:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), closes_at - loop.time())
+            except asyncio.TimeoutError:
+                break
+
+        batch = []
+        now = loop.time()
+        while self._pending and len(batch) < self.max_batch:
+            item, deadline, future, enqueued_at = self._pending.popleft()
+            if future.done() or deadline <= now:
+                # Timed out or cancelled while queued; the caller has been or will be told
+                self.counters["expired"] += 1
+                continue
+            metrics.observe(f"service_{self.name}_queue_wait", now - enqueued_at)
+            batch.append((item, future))
+        metrics.set_gauge(f"service_{self.name}_queue_depth", len(self._pending))
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            batch = await self._next_batch()
+            if not batch:
+                self._slots.release()
+                continue
+            self.counters["batches"] += 1
+            self.counters["batched_items"] += len(batch)
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        try:
+            with metrics.span(f"service_{self.name}_batch"):
+                # Callers can time out between the batch closing and this task starting
+                batch = [(item, future) for item, future in batch if not future.done()]
+                if not batch:
+                    return
+                try:
+                    results = await self.process([item for item, _ in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+
+class VerificationService:
+    """Shared face and voice verification for several gates over HTTP.
+
+    Endpoints (request body is a JPEG/PNG image or a WAV clip):
+
+        POST /verify/face?user=NAME
+        POST /identify/face
+        POST /verify/voice?user=NAME
+        GET  /stats, /metrics, /health
+
+    Face and voice requests go through separate MicroBatchers into a pool
+    of worker processes, and each batch is scored against the enrolled
+    templates in one vectorized step. An ``X-Deadline-Ms`` header
+    overrides ``deadline`` for one request.
+    """
+
+    def __init__(self, store, face_index, workers=None, max_batch=16, max_wait=0.005, max_pending=256,
+                 deadline=2.0, sample_rate=16000, quality_gate=True, face_tolerance=0.5, voice_threshold=20.0):
+        self.store = store
+        self.templates = TemplateCache(store)
+        self.face_index = face_index
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.sample_rate = sample_rate
+        self.quality_gate = quality_gate
+        self.face_tolerance = face_tolerance
+        self.voice_threshold = voice_threshold
+        self.executor = None
+        self.batchers = {}
+        self.server = None
+        self.responses = {}
+
+    async def start(self, host="127.0.0.1", port=8765, unix_socket=None):
+        ctx = mp.get_context("spawn")
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker,
+                                            initargs=(self.sample_rate, self.quality_gate))
+        loop = asyncio.get_running_loop()
+        # Start and warm up every worker before accepting requests
+        await asyncio.gather(*[loop.run_in_executor(self.executor, _worker_ready)
+                               for _ in range(self.workers)])
+
+        for name, process in (("face", self._process_faces), ("voice", self._process_voices)):
+            batcher = MicroBatcher(name, process, self.max_batch, self.max_wait, self.max_pending,
+                                   max_in_flight=self.workers)
+            batcher.start()
+            self.batchers[name] = batcher
+
+        if unix_socket:
+            self.server = await asyncio.start_unix_server(self.handle_connection, unix_socket)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for batcher in self.batchers.values():
+            batcher.stop()
+        if self.executor is not None:
+            # No new batches start once the batchers stop; the few in flight finish first
+            self.executor.shutdown()
+
+    # Batches
+
+    async def _process_faces(self, items):
+        # Images are encoded one by one, so a batch is spread over the workers rather than queued on one
+        loop = asyncio.get_running_loop()
+        images = [data for data, _ in items]
+        per_worker = -(-len(images) // self.workers)
+        parts = await asyncio.gather(*[loop.run_in_executor(self.executor, _encode_faces, images[i:i + per_worker])
+                                       for i in range(0, len(images), per_worker)])
+        encoded = [result for part in parts for result in part]
+
+        results = [None] * len(items)
+        verify, identify = [], []
+        for i, ((_, stored), (encoding, location, rejected, error)) in enumerate(zip(items, encoded)):
+            if error is not None:
+                results[i] = ValueError(error)
+            elif encoding is None:
+                results[i] = {"accepted": False, "score": None, "threshold": self.face_tolerance,
+                              "rejected": rejected or "no_face"}
+            else:
+                (verify if stored is not None else identify).append(i)
+                results[i] = {"location": [int(v) for v in location]}
+
+        if verify:
+            distances = nearest_distances([encoded[i][0] for i in verify], [items[i][1] for i in verify])
+            for i, distance in zip(verify, distances):
+                results[i].update(accepted=bool(distance <= self.face_tolerance), score=float(distance),
+                                  threshold=self.face_tolerance)
+        if identify:
+            # Users enrolled since the last batch, by the app or bulk_enroll.py
+            self.face_index.refresh()
+            matches = self.face_index.identify_batch([encoded[i][0] for i in identify], self.face_tolerance)
+            for i, (username, distance) in zip(identify, matches):
+                results[i].update(accepted=username is not None, score=distance,
+                                  threshold=self.face_tolerance, username=username)
+        return results
+
+    async def _process_voices(self, items):
+        loop = asyncio.get_running_loop()
+        encoded = await loop.run_in_executor(self.executor, _voice_signatures,
+                                             [(data, voiced_only) for data, _, voiced_only in items])
+
+        results = [None] * len(items)
+        ok = [i for i, (signature, _) in enumerate(encoded) if signature is not None]
+        for i, (_, error) in enumerate(encoded):
+            if error is not None:
+                results[i] = ValueError(error)
+        if ok:
+            signatures = np.stack([encoded[i][0] for i in ok])
+            stored = np.stack([items[i][1] for i in ok])
+            distances = np.linalg.norm(signatures - stored, axis=1)
+            for i, distance in zip(ok, distances):
+                results[i] = {"accepted": bool(distance < self.voice_threshold), "score": float(distance),
+                              "threshold": self.voice_threshold}
+        return results
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                started = time.perf_counter()
+                status, payload, extra_headers = await self.dispatch(method, target, headers, body)
+                metrics.observe("service_request", time.perf_counter() - started)
+                self.responses[status] = self.responses.get(status, 0) + 1
+
+                close = headers.get('connection', '').lower() == 'close'
+                await self._respond(writer, status, payload, extra_headers, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, extra_headers=None, close=False):
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}"]
+        head += [f"{name}: {value}" for name, value in (extra_headers or {}).items()]
+        if close:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        """(status, payload, extra headers) for one request."""
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        user = query.get("user", [None])[0]
+
+        if method == "GET":
+            if url.path == "/health":
+                return 200, {"status": "ok", "workers": self.workers}, None
+            if url.path == "/stats":
+                return 200, self.stats(), None
+            if url.path == "/metrics":
+                return 200, metrics.to_prometheus(), None
+            return 404, {"error": "not found"}, None
+
+        if method != "POST":
+            return 405, {"error": "method not allowed"}, None
+
+        loop = asyncio.get_running_loop()
+        budget = self.deadline
+        if "x-deadline-ms" in headers:
+            try:
+                budget = float(headers["x-deadline-ms"]) / 1000.0
+            except ValueError:
+                budget = None
+            if budget is None or not math.isfinite(budget) or budget <= 0:
+                return 400, {"error": "X-Deadline-Ms must be a positive number of milliseconds"}, None
+        deadline = loop.time() + budget
+
+        if url.path == "/identify/face":
+            batcher, item = self.batchers["face"], (body, None)
+        elif url.path in ("/verify/face", "/verify/voice"):
+            if not user:
+                return 400, {"error": "missing user"}, None
+            record = self.templates.get(user)
+            if record is None:
+                return 404, {"error": f"unknown user {user}"}, None
+            if url.path == "/verify/face":
+                if len(record.face_encodings) == 0:
+                    return 409, {"error": f"user {user} has no enrolled face"}, None
+                batcher, item = self.batchers["face"], (body, record.face_encodings)
+            else:
+                batcher, item = self.batchers["voice"], (body, record.voice_signature, record.voiced_signature)
+        else:
+            return 404, {"error": "not found"}, None
+
+        try:
+            result = await batcher.submit(item, deadline)
+        except Overloaded:
+            return 503, {"error": "overloaded", "queue_depth": batcher.depth}, {"Retry-After": "1"}
+        except DeadlineExceeded:
+            return 504, {"error": "deadline exceeded"}, None
+        except ValueError as e:
+            return 400, {"error": str(e)}, None
+        except Exception as e:
+            print(f"Error processing {url.path}: {e}")
+            return 500, {"error": "internal error"}, None
+        return 200, result, None
+
+    def stats(self):
+        return {"workers": self.workers,
+                "responses": {str(status): count for status, count in sorted(self.responses.items())},
+                "batchers": {name: batcher.stats() for name, batcher in self.batchers.items()},
+                "templates": self.templates.stats()}
+
+
+async def serve(service, host, port, unix_socket):
+    server = await service.start(host, port, unix_socket)
+    where = unix_socket or f"http://{host}:{port}"
+    print(f"Verification service listening on {where} with {service.workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face and voice verification service shared by several gates")
+    parser.add_argument("--data-dir", default="auth_system_data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--max-batch", type=int, default=16, help="requests per batched call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="how long a batch waits for more requests after its first one")
+    parser.add_argument("--max-pending", type=int, default=256,
+                        help="queued requests per modality before new ones get 503")
+    parser.add_argument("--deadline-ms", type=float, default=2000.0,
+                        help="default per-request deadline; X-Deadline-Ms overrides it")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="WAV clips must use this rate")
+    parser.add_argument("--no-quality-gate", action="store_true")
+    args = parser.parse_args()
+
+    metrics.enabled = True
+    store = EnrollmentStore(os.path.join(args.data_dir, "enrollments.fvs"))
+    face_index = FaceIndex(os.path.join(args.data_dir, "face_index"))
+    face_index.sync(store)
+
+    service = VerificationService(store, face_index,
+                                  workers=args.workers,
+                                  max_batch=args.max_batch,
+                                  max_wait=args.max_wait_ms / 1000.0,
+                                  max_pending=args.max_pending,
+                                  deadline=args.deadline_ms / 1000.0,
+                                  sample_rate=args.sample_rate,
+                                  quality_gate=not args.no_quality_gate)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+class EnergyVAD:
+    """Frame-level voice activity detection from RMS energy.
+
+    A frame is voiced when its RMS is well above the noise floor, which is
+    estimated from the quietest frames seen so far. The detector itself is
+    stateless: streaming callers pass back the floor returned by mask().
+    """
+
+    def __init__(self, min_rms=0.005, floor_ratio=3.0, floor_percentile=10, floor_rise=1.05):
+        self.min_rms = min_rms
+        self.floor_ratio = floor_ratio
+        self.floor_percentile = floor_percentile
+        self.floor_rise = floor_rise
+
+    def mask(self, rms, noise_floor=None):
+        """Return (voiced, noise_floor) for a 1-D array of per-frame RMS values."""
+        rms = np.asarray(rms)
+        if rms.size == 0:
+            return np.zeros(0, dtype=bool), noise_floor
+
+        frame_floor = float(np.percentile(rms, self.floor_percentile))
+        if noise_floor is not None:
+            # Let the floor creep up slowly so a noisy room is not mistaken for speech forever
+            frame_floor = min(frame_floor, noise_floor * self.floor_rise)
+
+        threshold = max(self.min_rms, frame_floor * self.floor_ratio)
+        return rms > threshold, frame_floor
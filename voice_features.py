@@ -0,0 +1,106 @@
+import functools
+
+import numpy as np
+
+# Matches librosa.feature.mfcc defaults, so signatures stay comparable
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+
+
+def hz_to_mel(frequencies):
+    """Slaney mel scale: linear below 1 kHz, logarithmic above."""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    mels = frequencies / f_sp
+    log_region = frequencies >= min_log_hz
+    return np.where(log_region, min_log_mel + np.log(np.maximum(frequencies, min_log_hz) / min_log_hz) / logstep, mels)
+
+
+def mel_to_hz(mels):
+    mels = np.asarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    freqs = mels * f_sp
+    return np.where(mels >= min_log_mel, min_log_hz * np.exp(logstep * (mels - min_log_mel)), freqs)
+
+
+@functools.lru_cache(maxsize=None)
+def hann_window(n_fft):
+    """Periodic Hann window, as used for STFT analysis."""
+    return (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def mel_filterbank(sample_rate, n_fft, n_mels):
+    """Slaney-normalised triangular filters of shape (n_mels, 1 + n_fft // 2)."""
+    fft_freqs = np.linspace(0, sample_rate / 2, 1 + n_fft // 2)
+    mel_freqs = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(sample_rate / 2), n_mels + 2))
+
+    widths = np.diff(mel_freqs)
+    ramps = mel_freqs[:, None] - fft_freqs[None, :]
+    lower = -ramps[:-2] / widths[:-1, None]
+    upper = ramps[2:] / widths[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_freqs[2:] - mel_freqs[:-2]))[:, None]
+    return weights.astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def dct_matrix(n_mfcc, n_mels):
+    """First ``n_mfcc`` rows of the orthonormal DCT-II over ``n_mels`` bands."""
+    k = np.arange(n_mfcc)[:, None]
+    n = np.arange(n_mels)[None, :]
+    basis = np.sqrt(2.0 / n_mels) * np.cos(np.pi * k * (2 * n + 1) / (2 * n_mels))
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+def frame_signal(audio, frame_length=N_FFT, hop_length=HOP_LENGTH, center=True):
+    """Overlapping frames of shape (..., n_frames, frame_length), without copying.
+
+    With ``center`` the signal is zero-padded by half a frame on both sides,
+    so frame t is centred on sample t * hop_length.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if center:
+        pad = [(0, 0)] * (audio.ndim - 1) + [(frame_length // 2, frame_length // 2)]
+        audio = np.pad(audio, pad)
+    if audio.shape[-1] < frame_length:
+        return np.zeros(audio.shape[:-1] + (0, frame_length), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length, axis=-1)
+    return frames[..., ::hop_length, :]
+
+
+def frame_rms(audio, frame_length=N_FFT, hop_length=HOP_LENGTH, center=True):
+    """Root-mean-square energy per frame, shape (..., n_frames)."""
+    frames = frame_signal(audio, frame_length, hop_length, center)
+    return np.sqrt(np.mean(np.square(frames), axis=-1))
+
+
+def mfcc(audio, sample_rate=16000, n_mfcc=13, n_fft=N_FFT, hop_length=HOP_LENGTH,
+         n_mels=N_MELS, center=True, top_db=80.0):
+    """MFCCs of shape (..., n_mfcc, n_frames) for audio of shape (..., samples).
+
+    Same pipeline as librosa.feature.mfcc with its defaults: power STFT,
+    mel filterbank, dB scaling clipped ``top_db`` below the peak, DCT. The
+    window, filterbank and DCT matrices are built once per configuration.
+    Unlike librosa, the ``top_db`` clip is applied per clip rather than
+    across the whole batch.
+    """
+    frames = frame_signal(audio, n_fft, hop_length, center)
+    spectrum = np.fft.rfft(frames * hann_window(n_fft), axis=-1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+
+    mel = power @ mel_filterbank(sample_rate, n_fft, n_mels).T
+    log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10))
+    if top_db is not None and log_mel.shape[-2]:
+        peak = log_mel.max(axis=(-2, -1), keepdims=True)
+        log_mel = np.maximum(log_mel, peak - top_db)
+
+    return np.swapaxes(log_mel @ dct_matrix(n_mfcc, n_mels).T, -1, -2)
@@ -0,0 +1,156 @@
+import threading
+
+import numpy as np
+
+# Queries scored per matrix product, keeping the score block around 64 MB
+MAX_BLOCK_SCORES = 1 << 24
+
+
+class VoiceIndex:
+    """1:N speaker search over every enrolled voice signature.
+
+    Signatures are centred on ``center`` (the population mean, by default
+    from from_store()) and scaled to unit length, then kept as the rows of
+    one contiguous float32 matrix. Cosine similarities of a query to every
+    user, higher meaning more alike, then take a single matrix product.
+    add() writes or overwrites a user's row in place; remove() moves the
+    last row into the hole, so the matrix stays dense.
+    """
+
+    def __init__(self, dim=13, center=None, initial_capacity=1024):
+        self.dim = dim
+        self.center = np.zeros(dim, dtype=np.float32) if center is None else np.asarray(center, dtype=np.float32)
+        self.matrix = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self.row_users = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store, initial_capacity=1024):
+        """Index every user in an EnrollmentStore, centred on their mean signature."""
+        users = [(record.username, record.voice_signature) for record in store.records()]
+        signatures = np.array([signature for _, signature in users], dtype=np.float32).reshape(-1, store.voice_dim)
+        center = signatures.mean(axis=0) if len(signatures) else None
+        index = cls(store.voice_dim, center, max(len(users), initial_capacity))
+        index.add_many(users)
+        return index
+
+    def __len__(self):
+        return len(self.row_users)
+
+    def __contains__(self, username):
+        return username in self._rows
+
+    def normalize(self, signatures):
+        """Centred, unit-length float32 rows for an array of signatures."""
+        rows = np.asarray(signatures, dtype=np.float32).reshape(-1, self.dim) - self.center
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        return rows / np.maximum(norms, 1e-12)
+
+    def add(self, username, signature):
+        self.add_many([(username, signature)])
+
+    def add_many(self, users):
+        """Add or replace several (username, signature) pairs."""
+        if not users:
+            return
+        rows = self.normalize([signature for _, signature in users])
+
+        with self._lock:
+            new_users = sum(1 for username, _ in users if username not in self._rows)
+            needed = len(self.row_users) + new_users
+            if needed > len(self.matrix):
+                grown = np.zeros((max(needed, 2 * len(self.matrix)), self.dim), dtype=np.float32)
+                grown[:len(self.row_users)] = self.matrix[:len(self.row_users)]
+                self.matrix = grown
+
+            for (username, _), row in zip(users, rows):
+                position = self._rows.get(username)
+                if position is None:
+                    position = self._rows[username] = len(self.row_users)
+                    self.row_users.append(username)
+                self.matrix[position] = row
+
+    def remove(self, username):
+        """Drop a user's row; returns False when the user was not indexed."""
+        with self._lock:
+            position = self._rows.pop(username, None)
+            if position is None:
+                return False
+            last = len(self.row_users) - 1
+            if position != last:
+                moved = self.row_users[last]
+                self.matrix[position] = self.matrix[last]
+                self.row_users[position] = moved
+                self._rows[moved] = position
+            self.row_users.pop()
+            return True
+
+    def similarities(self, signatures):
+        """(queries, users) cosine similarities, from one matrix product."""
+        queries = self.normalize(signatures)
+        with self._lock:
+            return queries @ self.matrix[:len(self.row_users)].T
+
+    def nearest(self, signature, k=1):
+        """The ``k`` most similar users as (username, similarity), best first."""
+        return self.nearest_batch([signature], k)[0]
+
+    def _score_blocks(self, queries, count):
+        """Similarities a block of queries at a time; call with the lock held."""
+        block = max(1, MAX_BLOCK_SCORES // max(count, 1))
+        for first in range(0, len(queries), block):
+            yield queries[first:first + block] @ self.matrix[:count].T
+
+    def nearest_batch(self, signatures, k=1):
+        queries = self.normalize(signatures)
+        results = []
+        with self._lock:
+            count = len(self.row_users)
+            if count == 0:
+                return [[] for _ in queries]
+            k = min(k, count)
+            for scores in self._score_blocks(queries, count):
+                # Partial selection of the top k, then a sort of just those
+                top = np.argpartition(scores, count - k, axis=1)[:, count - k:]
+                for row_scores, candidates in zip(scores, top):
+                    candidates = candidates[np.argsort(-row_scores[candidates])]
+                    results.append([(self.row_users[i], float(row_scores[i])) for i in candidates])
+        return results
+
+    def cohort_score(self, signature, username, cohort_size=50):
+        """(similarity, normalized score) of a clip's signature against a claimed user.
+
+        The normalized score is how many standard deviations the claimed
+        user's similarity lies above the ``cohort_size`` most similar other
+        users; a genuine speaker stands out, an impostor closer to someone
+        else does not. Both are None when the user is not indexed.
+        """
+        return self.cohort_scores([signature], [username], cohort_size)[0]
+
+    def cohort_scores(self, signatures, usernames, cohort_size=50):
+        queries = self.normalize(signatures)
+        results = []
+        with self._lock:
+            count = len(self.row_users)
+            positions = iter([self._rows.get(username) for username in usernames])
+            for scores in self._score_blocks(queries, count):
+                for row_scores in scores:
+                    results.append(self._cohort_score(row_scores, next(positions), count, cohort_size))
+        return results
+
+    @staticmethod
+    def _cohort_score(row_scores, position, count, cohort_size):
+        if position is None:
+            return None, None
+        similarity = float(row_scores[position])
+        size = min(cohort_size, count - 1)
+        if size == 0:
+            return similarity, None
+        # The size + 1 highest scores, smallest first; drop the claimed user or that smallest one
+        top = np.partition(row_scores, count - size - 1)[count - size - 1:]
+        if similarity >= top[0]:
+            cohort = np.delete(top, int(np.argmax(top == similarity)))
+        else:
+            cohort = top[1:]
+        return similarity, (similarity - float(cohort.mean())) / max(float(cohort.std()), 1e-6)
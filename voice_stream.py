@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+
+from verification_engine import VerificationResult
+from voice_activity import EnergyVAD
+from voice_features import HOP_LENGTH, N_FFT, frame_rms, mfcc
+
+
+class StreamingVoiceVerifier:
+    """Verify a voice while it is still being recorded.
+
+    Audio chunks from an AudioSource are turned into MFCC frames as they
+    arrive and voiced frames are added to a running mean. Once
+    ``min_voiced`` seconds of speech have been heard, the decision is made
+    early if the distance is clearly below ``accept_threshold`` or above
+    ``reject_threshold``; otherwise listening continues until
+    ``max_duration`` and the verifier's own voice threshold decides.
+    """
+
+    def __init__(self, verifier, accept_threshold=None, reject_threshold=None,
+                 min_voiced=1.0, max_duration=5.0, n_fft=N_FFT, hop_length=HOP_LENGTH):
+        self.verifier = verifier
+        self.accept_threshold = accept_threshold or 0.8 * verifier.voice_threshold
+        self.reject_threshold = reject_threshold or 1.5 * verifier.voice_threshold
+        self.min_voiced = min_voiced
+        self.max_duration = max_duration
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.voice_activity = verifier.voice_activity or EnergyVAD()
+
+    def _frames(self, audio):
+        """MFCC and RMS for every complete frame in ``audio``."""
+        mfcc_features = mfcc(audio, self.verifier.sample_rate, self.verifier.n_mfcc,
+                             n_fft=self.n_fft, hop_length=self.hop_length, center=False)
+        rms = frame_rms(audio, self.n_fft, self.hop_length, center=False)
+        return mfcc_features, rms
+
+    def verify(self, source, stored_signature, on_progress=None, should_stop=None, voiced_only=True):
+        """Verify audio from an open ``source`` against a stored signature.
+
+        ``on_progress(heard_seconds, voiced_seconds, distance)`` is called
+        after every chunk, and listening ends early when ``should_stop()``
+        returns True. The result's timings include ``first_decision``, the
+        seconds of audio heard before the decision was made. With
+        ``voiced_only=False``, for signatures enrolled over every frame,
+        all frames go into the running mean; speech is still required
+        before deciding.
+        """
+        sample_rate = self.verifier.sample_rate
+        stored_signature = np.asarray(stored_signature, dtype=np.float32)
+        timings = {'mfcc': 0.0}
+        pending = np.zeros(0, dtype=np.float32)
+        frame_sum = np.zeros(self.verifier.n_mfcc)
+        summed_frames = 0
+        voiced_frames = 0
+        heard = 0
+        noise_floor = None
+        distance = None
+
+        for chunk in source.chunks():
+            heard += len(chunk)
+            pending = np.concatenate([pending, chunk])
+
+            if len(pending) >= self.n_fft:
+                n_frames = 1 + (len(pending) - self.n_fft) // self.hop_length
+                start = time.perf_counter()
+                mfcc_features, rms = self._frames(pending[:(n_frames - 1) * self.hop_length + self.n_fft])
+                voiced, noise_floor = self.voice_activity.mask(rms, noise_floor)
+                summed = voiced if voiced_only else slice(None)
+                frame_sum += mfcc_features[:, summed].sum(axis=1)
+                summed_frames += mfcc_features[:, summed].shape[1]
+                voiced_frames += int(voiced.sum())
+                timings['mfcc'] += time.perf_counter() - start
+                # Keep the overlap the next frame still needs
+                pending = pending[n_frames * self.hop_length:]
+
+            if voiced_frames:
+                distance = float(np.linalg.norm(frame_sum / summed_frames - stored_signature))
+
+            voiced_seconds = voiced_frames * self.hop_length / sample_rate
+            if on_progress is not None:
+                on_progress(heard / sample_rate, voiced_seconds, distance)
+
+            if distance is not None and voiced_seconds >= self.min_voiced:
+                if distance < self.accept_threshold or distance > self.reject_threshold:
+                    break
+            if heard >= self.max_duration * sample_rate:
+                break
+            if should_stop is not None and should_stop():
+                break
+
+        timings['first_decision'] = heard / sample_rate
+        if distance is None:
+            return VerificationResult(False, None, self.verifier.voice_threshold, timings, rejected="no_speech")
+        return VerificationResult(distance < self.verifier.voice_threshold, distance,
+                                  self.verifier.voice_threshold, timings, template=frame_sum / summed_frames)